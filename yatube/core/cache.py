@@ -0,0 +1,327 @@
+"""Кэш, общий для всех процессов сервера.
+
+SQLiteCache хранит записи в отдельном файле SQLite, читает его через
+mmap и не требует внешнего сервиса. NearCache держит горячие ключи
+в памяти процесса и сверяет их с общим кэшем (SQLite, Redis или
+memcached) по короткой метке, не перечитывая само значение.
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from itertools import islice
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+# Предел числа параметров в одном запросе SQLite.
+CHUNK_SIZE = 500
+# Раз в сколько записей потока чистим просроченные и лишние записи.
+CULL_EVERY = 100
+
+
+def _chunks(items, size=CHUNK_SIZE):
+    items = iter(items)
+    return iter(lambda: list(islice(items, size)), [])
+
+
+class SQLiteCache(BaseCache):
+    """Кэш в файле SQLite.
+
+    Без LOCATION файл лежит рядом с основной базой, а для базы
+    в памяти (тесты) кэш тоже создается в памяти процесса.
+    """
+
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get("OPTIONS", {})
+        self._location = location
+        self._mmap_size = options.get("MMAP_SIZE", 256 * 1024 * 1024)
+        self._local = threading.local()
+
+    def _path(self):
+        if self._location:
+            return self._location
+        name = str(settings.DATABASES["default"]["NAME"])
+        if name == ":memory:" or "mode=memory" in name:
+            return "file:yatube_cache?mode=memory&cache=shared"
+        return f"{name}.cache"
+
+    def _connection(self):
+        """Соединение потока; после fork или смены файла — новое"""
+        path = self._path()
+        key = (os.getpid(), path)
+        if getattr(self._local, "key", None) != key:
+            db = sqlite3.connect(path, timeout=5, isolation_level=None,
+                                 uri=path.startswith("file:"))
+            db.execute("PRAGMA journal_mode = wal")
+            # Кэш можно потерять при сбое, fsync ему не нужен.
+            db.execute("PRAGMA synchronous = off")
+            db.execute(f"PRAGMA mmap_size = {int(self._mmap_size)}")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, "
+                "value BLOB NOT NULL, expires REAL) WITHOUT ROWID"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS cache_expires "
+                       "ON cache (expires)")
+            self._local.key = key
+            self._local.db = db
+            self._local.writes = 0
+        return self._local.db
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def get(self, key, default=None, version=None):
+        return self.get_many([key], version=version).get(key, default)
+
+    def get_many(self, keys, version=None):
+        keys = {self._key(key, version): key for key in keys}
+        db = self._connection()
+        found = {}
+        for chunk in _chunks(keys):
+            rows = db.execute(
+                f"SELECT key, value FROM cache WHERE key IN "
+                f"({', '.join('?' * len(chunk))}) "
+                f"AND (expires IS NULL OR expires > ?)",
+                [*chunk, time.time()],
+            )
+            for key, value in rows:
+                found[keys[key]] = pickle.loads(value)
+        return found
+
+    def _write(self, rows, timeout):
+        """Пишем пары (ключ, значение) одной транзакцией"""
+        expires = self.get_backend_timeout(timeout)
+        db = self._connection()
+        if expires is not None and expires <= time.time():
+            keys = [key for key, _ in rows]
+            for chunk in _chunks(keys):
+                db.execute(f"DELETE FROM cache WHERE key IN "
+                           f"({', '.join('?' * len(chunk))})", chunk)
+            return
+        with db:
+            db.execute("BEGIN IMMEDIATE")
+            db.executemany(
+                "INSERT OR REPLACE INTO cache (key, value, expires) "
+                "VALUES (?, ?, ?)",
+                [(key, pickle.dumps(value, self.pickle_protocol), expires)
+                 for key, value in rows],
+            )
+        self._local.writes += len(rows)
+        if self._local.writes >= CULL_EVERY:
+            self._local.writes = 0
+            self._cull(db)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._write([(self._key(key, version), value)], timeout)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        self._write([(self._key(key, version), value)
+                     for key, value in data.items()], timeout)
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        db = self._connection()
+        changes = db.total_changes
+        db.execute(
+            "INSERT INTO cache (key, value, expires) VALUES (?, ?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET value = excluded.value, "
+            "expires = excluded.expires "
+            "WHERE cache.expires IS NOT NULL AND cache.expires <= ?",
+            (key, pickle.dumps(value, self.pickle_protocol),
+             self.get_backend_timeout(timeout), time.time()),
+        )
+        return db.total_changes > changes
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        cursor = self._connection().execute(
+            "UPDATE cache SET expires = ? WHERE key = ? "
+            "AND (expires IS NULL OR expires > ?)",
+            (self.get_backend_timeout(timeout), self._key(key, version),
+             time.time()),
+        )
+        return cursor.rowcount > 0
+
+    def has_key(self, key, version=None):
+        return key in self.get_many([key], version=version)
+
+    def delete(self, key, version=None):
+        cursor = self._connection().execute(
+            "DELETE FROM cache WHERE key = ?", (self._key(key, version),)
+        )
+        return cursor.rowcount > 0
+
+    def delete_many(self, keys, version=None):
+        keys = [self._key(key, version) for key in keys]
+        db = self._connection()
+        for chunk in _chunks(keys):
+            db.execute(f"DELETE FROM cache WHERE key IN "
+                       f"({', '.join('?' * len(chunk))})", chunk)
+
+    def clear(self):
+        self._connection().execute("DELETE FROM cache")
+
+    def _cull(self, db):
+        db.execute("DELETE FROM cache WHERE expires <= ?", (time.time(),))
+        count = db.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        if count <= self._max_entries:
+            return
+        if not self._cull_frequency:
+            db.execute("DELETE FROM cache")
+            return
+        db.execute(
+            "DELETE FROM cache WHERE key IN (SELECT key FROM cache "
+            "ORDER BY expires IS NULL, expires LIMIT ?)",
+            (count // self._cull_frequency,),
+        )
+
+
+# Ближний кэш общий для всех потоков процесса, как у LocMemCache.
+_near = {}
+_near_locks = {}
+
+
+class NearCache(BaseCache):
+    """Двухуровневый кэш: память процесса поверх общего кэша.
+
+    Значение живет в памяти не дольше LOCAL_TIMEOUT секунд. Потом
+    его метка сверяется с общим кэшем: если другой процесс за это
+    время записал или удалил ключ, значение перечитывается. Запись
+    идет сразу в оба уровня.
+    """
+
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+    STAMP_SUFFIX = ":stamp"
+
+    def __init__(self, name, params):
+        super().__init__(params)
+        options = params.get("OPTIONS", {})
+        self._shared_alias = options["SHARED"]
+        self._local_timeout = options.get("LOCAL_TIMEOUT", 1)
+        self._entries = _near.setdefault(name, OrderedDict())
+        self._lock = _near_locks.setdefault(name, threading.Lock())
+
+    @property
+    def _shared(self):
+        return caches[self._shared_alias]
+
+    def _stamp_key(self, key):
+        return f"{key}{self.STAMP_SUFFIX}"
+
+    def _timeout(self, timeout):
+        return self.default_timeout if timeout is DEFAULT_TIMEOUT else timeout
+
+    def _pickle(self, value):
+        return pickle.dumps(value, self.pickle_protocol)
+
+    def _remember(self, key, stamp, pickled, timeout):
+        expires = time.time() + self._local_timeout
+        backend_timeout = self.get_backend_timeout(timeout)
+        if backend_timeout is not None:
+            expires = min(expires, backend_timeout)
+        with self._lock:
+            self._entries[key] = (expires, stamp, pickled, timeout)
+            self._entries.move_to_end(key, last=False)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem()
+
+    def _forget(self, keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def get(self, key, default=None, version=None):
+        return self.get_many([key], version=version).get(key, default)
+
+    def get_many(self, keys, version=None):
+        keys = {self.make_key(key, version=version): key for key in keys}
+        found, stale, now = {}, {}, time.time()
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                if entry[0] > now:
+                    found[key] = entry[2]
+                    self._entries.move_to_end(key, last=False)
+                else:
+                    stale[key] = entry
+        if stale:
+            stamps = self._shared.get_many(
+                [self._stamp_key(key) for key in stale]
+            )
+            for key, (_, stamp, pickled, timeout) in stale.items():
+                if stamps.get(self._stamp_key(key)) == stamp:
+                    found[key] = pickled
+                    self._remember(key, stamp, pickled, timeout)
+        missing = [key for key in keys if key not in found]
+        result = {keys[key]: pickle.loads(pickled)
+                  for key, pickled in found.items()}
+        if missing:
+            entries = self._shared.get_many(missing)
+            self._forget(key for key in missing if key not in entries)
+            for key, (stamp, value, timeout) in entries.items():
+                self._remember(key, stamp, self._pickle(value), timeout)
+                result[keys[key]] = value
+        return result
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout, version=version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self._timeout(timeout)
+        shared = {}
+        for key, value in data.items():
+            key = self.make_key(key, version=version)
+            self.validate_key(key)
+            stamp = uuid4().hex
+            shared[key] = (stamp, value, timeout)
+            shared[self._stamp_key(key)] = stamp
+            self._remember(key, stamp, self._pickle(value), timeout)
+        return self._shared.set_many(shared, timeout)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self._timeout(timeout)
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        stamp = uuid4().hex
+        if not self._shared.add(key, (stamp, value, timeout), timeout):
+            return False
+        self._shared.set(self._stamp_key(key), stamp, timeout)
+        self._remember(key, stamp, self._pickle(value), timeout)
+        return True
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self._timeout(timeout)
+        key = self.make_key(key, version=version)
+        self._forget([key])
+        self._shared.touch(self._stamp_key(key), timeout)
+        return self._shared.touch(key, timeout)
+
+    def has_key(self, key, version=None):
+        return key in self.get_many([key], version=version)
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version=version)
+
+    def delete_many(self, keys, version=None):
+        keys = [self.make_key(key, version=version) for key in keys]
+        self._forget(keys)
+        self._shared.delete_many(
+            keys + [self._stamp_key(key) for key in keys]
+        )
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        self._shared.clear()
@@ -0,0 +1,49 @@
+from sorl.thumbnail.conf import settings
+from sorl.thumbnail.images import deserialize_image_file
+from sorl.thumbnail.kvstores.base import KVStoreBase, add_prefix
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+
+class KVStore(KVStoreBase):
+    """KV-хранилище sorl-thumbnail прямо в таблице базы данных.
+
+    В отличие от cached_db не держит копию в локальном кэше процесса:
+    данные переживают перезапуск и сразу видны всем процессам, а
+    get_many находит миниатюры целой страницы одним запросом.
+    """
+
+    def get_many(self, image_files):
+        """Словарь ключ -> ImageFile для найденных в хранилище файлов"""
+        keys = {add_prefix(image_file.key): image_file.key
+                for image_file in image_files}
+        if not keys:
+            return {}
+        rows = KVStoreModel.objects.filter(key__in=keys).values_list(
+            "key", "value"
+        )
+        return {keys[key]: deserialize_image_file(value)
+                for key, value in rows}
+
+    def clear(self, delete_thumbnails=False):
+        KVStoreModel.objects.filter(
+            key__startswith=settings.THUMBNAIL_KEY_PREFIX
+        ).delete()
+        if delete_thumbnails:
+            self.delete_all_thumbnail_files()
+
+    def _get_raw(self, key):
+        return KVStoreModel.objects.filter(key=key).values_list(
+            "value", flat=True
+        ).first()
+
+    def _set_raw(self, key, value):
+        KVStoreModel.objects.update_or_create(key=key,
+                                              defaults={"value": value})
+
+    def _delete_raw(self, *keys):
+        KVStoreModel.objects.filter(key__in=keys).delete()
+
+    def _find_keys_raw(self, prefix):
+        return KVStoreModel.objects.filter(
+            key__startswith=prefix
+        ).values_list("key", flat=True)
@@ -0,0 +1,100 @@
+import random
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections
+from django.test.utils import override_settings
+
+from posts import feed
+from posts.models import Comment, Post, User
+from posts.settings import POSTS_PER_PAGE
+
+# Прагмы SQLite по умолчанию: журнал отката и fsync на каждый коммит.
+BASELINE_PRAGMAS = {
+    "journal_mode": "delete",
+    "synchronous": "full",
+}
+
+
+class Worker(threading.Thread):
+    """Поток нагрузки: повторяет действие до сигнала остановки"""
+
+    def __init__(self, action, stop):
+        super().__init__(daemon=True)
+        self.action = action
+        self.stop = stop
+        self.done = 0
+        self.errors = 0
+
+    def run(self):
+        try:
+            while not self.stop.is_set():
+                try:
+                    self.action()
+                    self.done += 1
+                except OperationalError:
+                    self.errors += 1
+        finally:
+            connections.close_all()
+
+
+class Command(BaseCommand):
+    help = ("Замеряет чтение ленты из SQLite под конкурентной записью "
+            "комментариев")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--readers", type=int, default=4)
+        parser.add_argument("--writers", type=int, default=1)
+        parser.add_argument("--seconds", type=float, default=10)
+        parser.add_argument("--baseline", action="store_true",
+                            help="Без WAL, прагм, BEGIN IMMEDIATE и повторов")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("Замер рассчитан на SQLite")
+        self.post_ids = list(Post.objects.values_list("pk", flat=True))
+        self.user_ids = list(User.objects.values_list("pk", flat=True))
+        if not self.post_ids:
+            raise CommandError("Нет постов: запустите generate_feed_data")
+        tuning = {}
+        if options["baseline"]:
+            tuning = {"SQLITE_PRAGMAS": BASELINE_PRAGMAS,
+                      "SQLITE_TRANSACTION_MODE": None,
+                      "SQLITE_LOCK_RETRIES": 0}
+        connection.close()
+        with override_settings(**tuning):
+            readers, writers = self.run(options)
+            connection.close()
+        seconds = options["seconds"]
+        for name, workers in (("чтение", readers), ("запись", writers)):
+            done = sum(worker.done for worker in workers)
+            errors = sum(worker.errors for worker in workers)
+            self.stdout.write(
+                f"{name}: {done / seconds:.0f} оп/с, "
+                f"ошибок блокировки {errors}"
+            )
+
+    def run(self, options):
+        stop = threading.Event()
+        readers = [Worker(self.read, stop) for _ in range(options["readers"])]
+        writers = [Worker(self.write, stop)
+                   for _ in range(options["writers"])]
+        for worker in readers + writers:
+            worker.start()
+        time.sleep(options["seconds"])
+        stop.set()
+        for worker in readers + writers:
+            worker.join()
+        return readers, writers
+
+    def read(self):
+        posts = feed.for_listing(Post.objects.order_by("-pub_date", "-pk"))
+        list(posts[:POSTS_PER_PAGE])
+
+    def write(self):
+        Comment.objects.create(
+            post_id=random.choice(self.post_ids),
+            author_id=random.choice(self.user_ids),
+            text="Комментарий для замера",
+        )
@@ -0,0 +1,70 @@
+import json
+import logging
+import random
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from . import profiling, replicas
+
+logger = logging.getLogger("yatube.profiling")
+
+
+class ProfilingMiddleware:
+    """Профилирование запросов.
+
+    Добавляет заголовок Server-Timing при DEBUG или для сотрудников:
+    в нем число запросов и имена шаблонов, посторонним их видеть
+    незачем. Медленные запросы всех посетителей с заданной вероятностью
+    пишутся подробным отчетом в лог yatube.profiling.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        profiling.instrument_templates()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = profiling.start()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(profiling.query_wrapper)
+                    )
+                response = self.get_response(request)
+            profile = profiling.current()
+        finally:
+            profiling.stop(token)
+        profile.finish()
+        user = getattr(request, "user", None)
+        if settings.DEBUG or getattr(user, "is_staff", False):
+            response["Server-Timing"] = profile.server_timing()
+        if (profile.total_ms >= settings.PROFILING_SLOW_MS
+                and random.random() < settings.PROFILING_SAMPLE_RATE):
+            logger.warning(json.dumps(profile.report(request, response),
+                                      ensure_ascii=False))
+        return response
+
+
+class ReplicaMiddleware:
+    """Направляет чтение помеченных view на реплики (core.replicas)"""
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            return self.get_response(request)
+        finally:
+            token = getattr(request, "_replica_token", None)
+            if token is not None:
+                replicas.stop(token)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._replica_token = replicas.start(request, view_func)
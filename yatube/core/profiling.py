@@ -0,0 +1,150 @@
+"""Сбор метрик одного запроса: SQL, шаблоны и миниатюры.
+
+Метрики копятся в профиле, привязанном к контексту запроса, поэтому
+инструментированный код просто ничего не делает вне профилируемого
+запроса.
+"""
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.template.base import Template
+
+_current = ContextVar("profile", default=None)
+_templates_instrumented = False
+
+
+class Profile:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.total_ms = 0.0
+        self.queries = []
+        self.timings = defaultdict(lambda: [0, 0.0])
+
+    def add(self, kind, name, elapsed_ms):
+        timing = self.timings[(kind, name)]
+        timing[0] += 1
+        timing[1] += elapsed_ms
+
+    def add_query(self, sql, params, elapsed_ms):
+        self.queries.append((sql, repr(params), elapsed_ms))
+
+    def finish(self):
+        self.total_ms = (time.perf_counter() - self.started) * 1000
+
+    @property
+    def sql_ms(self):
+        return sum(elapsed for _, _, elapsed in self.queries)
+
+    def duplicates(self):
+        """Запросы, выполненные больше одного раза с теми же параметрами"""
+        counter = Counter((sql, params) for sql, params, _ in self.queries)
+        return {sql: count for (sql, _), count in counter.items()
+                if count > 1}
+
+    def similar(self):
+        """Одинаковый SQL с разными параметрами, признак N+1"""
+        counter = Counter(sql for sql, _, _ in self.queries)
+        return {sql: count for sql, count in counter.items() if count > 1}
+
+    def kind_ms(self, kind):
+        return sum(ms for (timing_kind, _), (_, ms) in self.timings.items()
+                   if timing_kind == kind)
+
+    def server_timing(self):
+        """Значение заголовка Server-Timing"""
+        metrics = [
+            f'db;dur={self.sql_ms:.1f};desc="{len(self.queries)} queries"',
+            f"thumbnail;dur={self.kind_ms('thumbnail'):.1f}",
+        ]
+        templates = sorted(
+            (name, count, ms)
+            for (kind, name), (count, ms) in self.timings.items()
+            if kind == "template"
+        )
+        for number, (name, count, ms) in enumerate(templates):
+            metrics.append(
+                f'tpl{number};dur={ms:.1f};desc="{name} x{count}"'
+            )
+        metrics.append(f"total;dur={self.total_ms:.1f}")
+        return ", ".join(metrics)
+
+    def report(self, request, response):
+        templates = {
+            name: {"count": count, "ms": round(ms, 2)}
+            for (kind, name), (count, ms) in self.timings.items()
+            if kind == "template"
+        }
+        thumbnails = {
+            name: {"count": count, "ms": round(ms, 2)}
+            for (kind, name), (count, ms) in self.timings.items()
+            if kind != "template"
+        }
+        return {
+            "method": request.method,
+            "path": request.get_full_path(),
+            "status": response.status_code,
+            "total_ms": round(self.total_ms, 2),
+            "sql_ms": round(self.sql_ms, 2),
+            "queries": len(self.queries),
+            "duplicate_queries": self.duplicates(),
+            "similar_queries": self.similar(),
+            "templates": templates,
+            "thumbnails": thumbnails,
+        }
+
+
+def current():
+    return _current.get()
+
+
+def start():
+    return _current.set(Profile())
+
+
+def stop(token):
+    _current.reset(token)
+
+
+@contextmanager
+def timed(kind, name):
+    """Замеряем участок кода, если запрос профилируется"""
+    profile = current()
+    if profile is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.add(kind, name, (time.perf_counter() - started) * 1000)
+
+
+def query_wrapper(execute, sql, params, many, context):
+    """Обертка для connection.execute_wrapper"""
+    profile = current()
+    if profile is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.add_query(sql, params,
+                          (time.perf_counter() - started) * 1000)
+
+
+def instrument_templates():
+    """Оборачиваем Template._render, время вложенных шаблонов включается"""
+    global _templates_instrumented
+    if _templates_instrumented:
+        return
+    original = Template._render
+
+    def _render(self, context):
+        name = getattr(self.origin, "template_name", None) or self.name
+        with timed("template", name or "<string>"):
+            return original(self, context)
+
+    Template._render = _render
+    _templates_instrumented = True
@@ -0,0 +1,83 @@
+"""Чтение с реплик базы данных.
+
+View, помеченные read_replica, читают со случайной реплики из
+DATABASE_REPLICAS, остальные — с основной базы. После записи через
+view, помеченную writes_primary, пользователь на REPLICA_STICKY_SECONDS
+закрепляется за основной базой и видит свои изменения, даже если
+реплика еще отстает.
+
+Поколения кэша сигналы сдвигают на основной базе сразу, а отстающая
+реплика может отдать под новым поколением старые строки. Поэтому
+прочитанное с реплики кладется в кэш не дольше REPLICA_CACHE_TIMEOUT.
+"""
+import random
+import time
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+
+PIN_SESSION_KEY = "_replica_pinned_until"
+
+_alias = ContextVar("replica_alias", default=None)
+
+
+def read_replica(view):
+    """Помечаем view, которой достаточно чтения с реплики"""
+    view.read_replica = True
+    return view
+
+
+def writes_primary(view):
+    """После успешной записи (редиректа) читаем с основной базы"""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        if response.status_code in (301, 302, 303):
+            pin(request)
+        return response
+    return wrapper
+
+
+def pin(request):
+    request.session[PIN_SESSION_KEY] = (
+        time.time() + settings.REPLICA_STICKY_SECONDS
+    )
+
+
+def pinned(request):
+    session = getattr(request, "session", None)
+    return bool(session) and session.get(PIN_SESSION_KEY, 0) > time.time()
+
+
+def current():
+    """Реплика для чтения в текущем запросе или None"""
+    return _alias.get()
+
+
+def cache_timeout(timeout):
+    """Срок жизни в кэше данных, прочитанных в текущем запросе"""
+    if current() is None:
+        return timeout
+    if timeout is None:
+        return settings.REPLICA_CACHE_TIMEOUT
+    return min(timeout, settings.REPLICA_CACHE_TIMEOUT)
+
+
+def start(request, view):
+    """Выбираем, откуда читать view"""
+    user = getattr(request, "user", None)
+    if user is not None:
+        # Пользователя сессии загружаем с основной базы: сразу после
+        # регистрации реплика может его еще не знать.
+        user.is_authenticated
+    if (getattr(view, "read_replica", False)
+            and request.method in ("GET", "HEAD")
+            and settings.DATABASE_REPLICAS
+            and not pinned(request)):
+        return _alias.set(random.choice(settings.DATABASE_REPLICAS))
+    return _alias.set(None)
+
+
+def stop(token):
+    _alias.reset(token)
@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+from . import replicas
+
+
+class ReplicaRouter:
+    """Чтение с реплики, выбранной для запроса, запись — в основную базу"""
+
+    def db_for_read(self, model, **hints):
+        return replicas.current()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if {obj1._state.db, obj2._state.db} <= databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASE_REPLICAS
@@ -0,0 +1,51 @@
+import logging
+import random
+import time
+
+from django.conf import settings
+from django.db import OperationalError
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+LOCKED = "database is locked"
+
+
+def retry_locked(execute, sql, params, many, context):
+    """Повторяем запрос вне транзакции, если база занята записью.
+
+    Внутри транзакции повтор одного запроса не поможет: SQLite вернет
+    ту же ошибку, пока не откатится вся транзакция. Поэтому транзакции
+    начинаются с BEGIN IMMEDIATE: блокировка записи берется сразу,
+    ожидание и повторы приходятся на сам BEGIN, а не на середину
+    транзакции, которая в WAL иначе падает без ожидания.
+    """
+    connection = context["connection"]
+    if sql == "BEGIN" and settings.SQLITE_TRANSACTION_MODE:
+        sql = f"BEGIN {settings.SQLITE_TRANSACTION_MODE}"
+    delay = settings.SQLITE_RETRY_DELAY
+    for attempt in range(settings.SQLITE_LOCK_RETRIES):
+        try:
+            return execute(sql, params, many, context)
+        except OperationalError as error:
+            if LOCKED not in str(error) or connection.in_atomic_block:
+                raise
+            logger.warning("SQLite занята, повтор %s: %s", attempt + 1, sql)
+            time.sleep(delay * random.uniform(0.5, 1.5))
+            delay *= 2
+    return execute(sql, params, many, context)
+
+
+@receiver(connection_created)
+def tune_sqlite(sender, connection, **kwargs):
+    """Прагмы SQLITE_PRAGMAS и повтор запросов при блокировке"""
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+    if retry_locked not in connection.execute_wrappers:
+        # В начало списка: middleware профилирования снимает свою
+        # обертку через pop() и не должна задеть эту.
+        connection.execute_wrappers.insert(0, retry_locked)
@@ -0,0 +1,99 @@
+"""Защита кэша от лавины одинаковых пересчетов.
+
+Значение пересчитывает только запрос, взявший блокировку ключа.
+Остальные в это время получают устаревшую копию или недолго ждут
+нового значения. Значения со сроком жизни пересчитываются досрочно
+с вероятностью, растущей к концу срока (XFetch), поэтому истечение
+ключа не совпадает у всех запросов сразу.
+"""
+import math
+import random
+import time
+
+from django.conf import settings
+from django.core.cache import cache as default_cache
+
+LOCK_SUFFIX = ":lock"
+STALE_ATTR = "served_stale"
+# Как часто ждущий запрос проверяет, готово ли значение.
+POLL_INTERVAL = 0.05
+
+
+def _early(expires, delta):
+    """Пора ли пересчитать значение до истечения срока"""
+    if expires is None:
+        return False
+    jitter = -delta * settings.STAMPEDE_BETA * math.log(
+        1 - random.random()
+    )
+    return time.time() + jitter >= expires
+
+
+def _build(cache, key, build, timeout, stale_key):
+    started = time.time()
+    try:
+        value = build()
+        delta = time.time() - started
+        if timeout is None:
+            cache.set(key, (value, None, delta), None)
+        else:
+            # Ключ живет дольше срока, чтобы отдавать его, пока
+            # значение пересчитывается.
+            cache.set(key, (value, started + timeout, delta),
+                      timeout + settings.STAMPEDE_STALE_TIMEOUT)
+        if stale_key:
+            cache.set(stale_key, value, settings.STAMPEDE_STALE_TIMEOUT)
+        return value
+    finally:
+        cache.delete(key + LOCK_SUFFIX)
+
+
+def _lock(cache, key):
+    return cache.add(key + LOCK_SUFFIX, 1, settings.STAMPEDE_LOCK_TIMEOUT)
+
+
+def _wait(cache, key):
+    deadline = time.time() + settings.STAMPEDE_WAIT
+    while time.time() < deadline:
+        time.sleep(POLL_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry
+    return None
+
+
+def get_or_build(key, build, timeout=None, stale_key=None, cache=None):
+    """Значение ключа и признак свежести: (value, fresh).
+
+    build() вызывается без аргументов. stale_key — ключ последнего
+    построенного значения без учета поколения: его отдают, пока новое
+    поколение строит другой запрос.
+    """
+    cache = cache or default_cache
+    entry = cache.get(key)
+    if entry is not None:
+        value, expires, delta = entry
+        if not _early(expires, delta):
+            return value, True
+        if not _lock(cache, key):
+            return value, expires > time.time()
+        return _build(cache, key, build, timeout, stale_key), True
+    if _lock(cache, key):
+        return _build(cache, key, build, timeout, stale_key), True
+    stale = cache.get(stale_key) if stale_key else None
+    if stale is not None:
+        return stale, False
+    entry = _wait(cache, key)
+    if entry is not None:
+        return entry[0], True
+    # Строящий запрос не успел или упал: строим сами.
+    return build(), True
+
+
+def mark_stale(request):
+    """Ответ с устаревшими фрагментами не кладем в кэш страниц"""
+    setattr(request, STALE_ATTR, True)
+
+
+def served_stale(request):
+    return getattr(request, STALE_ATTR, False)
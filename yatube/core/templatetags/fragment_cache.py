@@ -0,0 +1,104 @@
+from django.core.cache import InvalidCacheBackendError, caches
+from django.core.cache.utils import make_template_fragment_key
+from django.template import Library, TemplateSyntaxError, VariableDoesNotExist
+from django.templatetags.cache import CacheNode
+
+from core import replicas, stampede
+
+register = Library()
+
+
+class StampedeCacheNode(CacheNode):
+    def __init__(self, nodelist, expire_time_var, fragment_name, vary_on,
+                 cache_name, version):
+        super().__init__(nodelist, expire_time_var, fragment_name, vary_on,
+                         cache_name)
+        self.version = version
+
+    def _resolve(self, var, context):
+        try:
+            return var.resolve(context)
+        except VariableDoesNotExist:
+            raise TemplateSyntaxError(
+                f'"cache" tag got an unknown variable: {var.var!r}'
+            )
+
+    def _timeout(self, context):
+        expire_time = self._resolve(self.expire_time_var, context)
+        if expire_time is None:
+            return None
+        try:
+            return int(expire_time)
+        except (ValueError, TypeError):
+            raise TemplateSyntaxError(
+                f'"cache" tag got a non-integer timeout value: '
+                f'{expire_time!r}'
+            )
+
+    def _cache(self, context):
+        if not self.cache_name:
+            try:
+                return caches["template_fragments"]
+            except InvalidCacheBackendError:
+                return caches["default"]
+        cache_name = self._resolve(self.cache_name, context)
+        try:
+            return caches[cache_name]
+        except InvalidCacheBackendError:
+            raise TemplateSyntaxError(
+                f"Invalid cache name specified for cache tag: "
+                f"{cache_name!r}"
+            )
+
+    def render(self, context):
+        vary_on = [var.resolve(context) for var in self.vary_on]
+        stale_key = None
+        if self.version:
+            stale_key = make_template_fragment_key(
+                self.fragment_name, vary_on
+            ) + ":stale"
+            vary_on.append(self._resolve(self.version, context))
+        value, fresh = stampede.get_or_build(
+            make_template_fragment_key(self.fragment_name, vary_on),
+            lambda: self.nodelist.render(context),
+            timeout=replicas.cache_timeout(self._timeout(context)),
+            stale_key=stale_key,
+            cache=self._cache(context),
+        )
+        request = context.get("request")
+        if not fresh and request is not None:
+            stampede.mark_stale(request)
+        return value
+
+
+@register.tag("cache")
+def do_cache(parser, token):
+    """{% cache %} из django.templatetags.cache с защитой от лавины.
+
+    Поддерживает те же аргументы и необязательный version=: поколение
+    данных фрагмента. Пока фрагмент нового поколения строит один
+    запрос, остальные получают фрагмент предыдущего.
+
+        {% load fragment_cache %}
+        {% cache None index_page page version=cache_version %}
+        {% endcache %}
+    """
+    nodelist = parser.parse(("endcache",))
+    parser.delete_first_token()
+    tokens = token.split_contents()
+    if len(tokens) < 3:
+        raise TemplateSyntaxError(
+            f"'{tokens[0]}' tag requires at least 2 arguments."
+        )
+    options = {}
+    while tokens[-1].startswith(("using=", "version=")):
+        name, value = tokens.pop().split("=", 1)
+        options[name] = parser.compile_filter(value)
+    return StampedeCacheNode(
+        nodelist,
+        parser.compile_filter(tokens[1]),
+        tokens[2],
+        [parser.compile_filter(token) for token in tokens[3:]],
+        options.get("using"),
+        options.get("version"),
+    )
@@ -0,0 +1,86 @@
+import os
+import tempfile
+import time
+from unittest import mock
+
+from django.core.cache import caches
+from django.test import SimpleTestCase
+
+from core.cache import NearCache, SQLiteCache
+
+
+class SQLiteCacheTest(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, "cache.sqlite3")
+        # Два экземпляра на одном файле — как два воркера.
+        self.cache = SQLiteCache(path, {"OPTIONS": {"MAX_ENTRIES": 150}})
+        self.other = SQLiteCache(path, {})
+
+    def test_shared_between_instances(self):
+        """Запись одного экземпляра видна другому."""
+        self.cache.set_many({"a": 1, "b": {"c": [2]}})
+        self.assertEqual(self.other.get_many(["a", "b", "x"]),
+                         {"a": 1, "b": {"c": [2]}})
+        self.assertFalse(self.other.add("a", 3))
+        self.assertTrue(self.other.add("x", 3))
+        self.other.delete("a")
+        self.assertIsNone(self.cache.get("a"))
+        self.assertEqual(self.cache.get("x"), 3)
+
+    def test_expiry(self):
+        """Просроченные ключи не читаются и освобождаются для add."""
+        self.cache.set("a", 1, timeout=0)
+        self.assertFalse(self.cache.has_key("a"))
+        self.cache.set("b", 1)
+        self.assertTrue(self.cache.touch("b", timeout=-1))
+        self.assertIsNone(self.cache.get("b"))
+        self.assertTrue(self.cache.add("b", 2))
+        self.assertEqual(self.cache.get("b"), 2)
+
+    def test_cull(self):
+        """Лишние записи вытесняются, начиная с истекающих раньше."""
+        self.cache.set("forever", 1, timeout=None)
+        self.cache.set_many({f"key{number}": number
+                             for number in range(199)})
+        self.assertEqual(self.cache.get("forever"), 1)
+        self.assertEqual(
+            len(self.cache.get_many(f"key{number}" for number in range(199))),
+            199 - 200 // 3,
+        )
+
+
+class NearCacheTest(SimpleTestCase):
+    def setUp(self):
+        caches["shared"].clear()
+        options = {"OPTIONS": {"SHARED": "shared", "LOCAL_TIMEOUT": 60}}
+        self.cache = NearCache("near-test", options)
+        # Другой процесс со своей памятью поверх того же общего кэша.
+        self.other = NearCache("near-test-other", options)
+        self.addCleanup(self.cache.clear)
+
+    def test_local_hit_skips_shared(self):
+        """Горячий ключ читается из памяти без запроса к общему кэшу."""
+        self.cache.set("page", "<html>")
+        with mock.patch.object(SQLiteCache, "get_many") as shared_get:
+            self.assertEqual(self.cache.get("page"), "<html>")
+        shared_get.assert_not_called()
+        self.assertEqual(self.other.get("page"), "<html>")
+
+    def test_version_check(self):
+        """По истечении LOCAL_TIMEOUT сверяется только метка значения."""
+        clock = [time.time()]
+        with mock.patch("core.cache.time.time", lambda: clock[0]):
+            self.cache.set_many({"page": "old", "fresh": "value"})
+            self.other.set("page", "new")
+            self.assertEqual(self.cache.get("page"), "old")
+            clock[0] += 61
+            with mock.patch.object(SQLiteCache, "get_many", autospec=True,
+                                   side_effect=SQLiteCache.get_many) as get:
+                self.assertEqual(self.cache.get("fresh"), "value")
+            get.assert_called_once_with(mock.ANY, [":1:fresh:stamp"])
+            self.assertEqual(self.cache.get("page"), "new")
+            self.other.delete("page")
+            clock[0] += 61
+            self.assertIsNone(self.cache.get("page"))
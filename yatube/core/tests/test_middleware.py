@@ -0,0 +1,46 @@
+import json
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post, User
+
+INDEX_URL = reverse("posts:index")
+
+
+class ProfilingMiddlewareTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="auth")
+        cls.staff = User.objects.create_user(username="staff", is_staff=True)
+        Post.objects.create(author=cls.user, text="Тестовый пост")
+        cls.PROFILE_URL = reverse("posts:profile", args=[cls.user.username])
+
+    def test_server_timing_header(self):
+        """Ответ сотруднику содержит метрики SQL, шаблонов и времени."""
+        self.client.force_login(self.staff)
+        header = self.client.get(INDEX_URL)["Server-Timing"]
+        for metric in ("db;", "thumbnail;", "total;",
+                       'desc="includes/post.html x1"'):
+            with self.subTest(metric=metric):
+                self.assertIn(metric, header)
+
+    def test_server_timing_hidden_from_visitors(self):
+        """Посетителям заголовок отдается только при DEBUG."""
+        self.assertNotIn("Server-Timing", self.client.get(INDEX_URL))
+        self.client.force_login(self.user)
+        self.assertNotIn("Server-Timing", self.client.get(INDEX_URL))
+        with override_settings(DEBUG=True):
+            self.assertIn("Server-Timing", self.client.get(INDEX_URL))
+
+    @override_settings(PROFILING_SLOW_MS=0, PROFILING_SAMPLE_RATE=1)
+    def test_slow_request_report(self):
+        """Медленный запрос попадает в лог с отчетом о запросах."""
+        self.client.force_login(self.user)
+        with self.assertLogs("yatube.profiling", "WARNING") as logs:
+            self.client.get(self.PROFILE_URL)
+        report = json.loads(logs.records[0].getMessage())
+        self.assertEqual(report["path"], self.PROFILE_URL)
+        self.assertGreater(report["queries"], 0)
+        self.assertIn("posts/profile.html", report["templates"])
@@ -0,0 +1,128 @@
+import time
+from unittest import mock
+
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sessions.backends.cache import SessionStore
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.db import router
+from django.http import HttpResponse
+from django.template import Context, Template
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from core import replicas
+from core.middleware import ReplicaMiddleware
+from posts import views
+from posts.decorators import cache_anonymous_page
+from posts.settings import PAGE_CACHE_TIMEOUT
+from posts.models import Post, User
+
+
+@override_settings(DATABASE_REPLICAS=["replica"])
+class ReplicaRoutingTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="auth")
+        cls.post = Post.objects.create(author=cls.user, text="Тестовый пост")
+
+    def route(self, view, method="get", session=None):
+        """База, с которой view прочитала бы пост"""
+        request = getattr(RequestFactory(), method)("/")
+        request.user = AnonymousUser()
+        request.session = session or SessionStore()
+        databases = []
+
+        def get_response(request):
+            middleware.process_view(request, view, (), {})
+            databases.append(router.db_for_read(Post))
+            return HttpResponse()
+
+        middleware = ReplicaMiddleware(get_response)
+        middleware(request)
+        self.assertIsNone(replicas.current())
+        return databases[0]
+
+    def test_read_views_use_replica(self):
+        """Ленты и страница поста читают с реплики, запись — в default."""
+        for view in (views.index, views.group_posts, views.profile,
+                     views.post_detail, views.follow_index):
+            with self.subTest(view=view.__name__):
+                self.assertEqual(self.route(view), "replica")
+        self.assertEqual(router.db_for_write(Post), "default")
+
+    def test_other_views_use_primary(self):
+        """Остальные view и POST-запросы читают с основной базы."""
+        self.assertEqual(self.route(views.post_edit), "default")
+        self.assertEqual(self.route(views.index, method="post"), "default")
+
+    def test_read_your_writes(self):
+        """После своей записи пользователь читает с основной базы."""
+        self.client.force_login(self.user)
+        self.client.post(
+            reverse("posts:add_comment", args=[self.post.pk]),
+            {"text": "Комментарий"},
+        )
+        session = self.client.session
+        self.assertTrue(replicas.pinned(self.client))
+        self.assertEqual(self.route(views.index, session=session), "default")
+        session[replicas.PIN_SESSION_KEY] = time.time() - 1
+        self.assertEqual(self.route(views.index, session=session), "replica")
+
+
+@override_settings(DATABASE_REPLICAS=["replica"], REPLICA_CACHE_TIMEOUT=5)
+class ReplicaCacheTest(TestCase):
+    """Прочитанное с реплики живет в кэше недолго"""
+
+    def setUp(self):
+        cache.clear()
+
+    def request(self):
+        request = RequestFactory().get("/")
+        request.user = AnonymousUser()
+        request.session = SessionStore()
+        return request
+
+    def read(self, request, func):
+        """Вызываем func так, будто view читает с реплики"""
+        token = replicas.start(request, views.index)
+        try:
+            self.assertEqual(replicas.current(), "replica")
+            return func()
+        finally:
+            replicas.stop(token)
+
+    def test_cache_timeout(self):
+        """Срок кэша урезается только при чтении с реплики."""
+        self.assertEqual(replicas.cache_timeout(None), None)
+        self.assertEqual(self.read(self.request(),
+                                   lambda: replicas.cache_timeout(None)), 5)
+        self.assertEqual(self.read(self.request(),
+                                   lambda: replicas.cache_timeout(60)), 5)
+
+    def test_page_from_replica_expires_soon(self):
+        """Страница с реплики кладется в кэш на REPLICA_CACHE_TIMEOUT."""
+        view = cache_anonymous_page(lambda: ("index",))(
+            lambda request: HttpResponse("Пост")
+        )
+        with mock.patch.object(cache, "set", wraps=cache.set) as cache_set:
+            self.read(self.request(), lambda: view(self.request()))
+            self.assertEqual(cache_set.call_args[0][2], 5)
+            cache.clear()
+            view(self.request())
+            self.assertEqual(cache_set.call_args[0][2], PAGE_CACHE_TIMEOUT)
+
+    def test_fragment_from_replica_expires_soon(self):
+        """Фрагмент без срока с реплики получает короткий срок."""
+        template = Template(
+            "{% load fragment_cache %}{% cache None page %}Пост{% endcache %}"
+        )
+        now = time.time()
+        self.read(self.request(), lambda: template.render(Context()))
+        _, expires, _ = cache.get(make_template_fragment_key("page"))
+        self.assertLessEqual(expires, now + 6)
+        cache.clear()
+        template.render(Context())
+        _, expires, _ = cache.get(make_template_fragment_key("page"))
+        self.assertIsNone(expires)
@@ -0,0 +1,57 @@
+from unittest import mock
+
+from django.db import OperationalError, connection
+from django.test import TestCase, override_settings
+
+from core import sqlite
+
+
+class SQLiteTuningTest(TestCase):
+    def test_pragmas_applied(self):
+        """Новое соединение получает прагмы из настроек."""
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA synchronous")
+            self.assertEqual(cursor.fetchone()[0], 1)
+            cursor.execute("PRAGMA temp_store")
+            self.assertEqual(cursor.fetchone()[0], 2)
+        self.assertEqual(connection.execute_wrappers.count(
+            sqlite.retry_locked
+        ), 1)
+
+    @override_settings(SQLITE_LOCK_RETRIES=2, SQLITE_RETRY_DELAY=0)
+    def test_retry_locked(self):
+        """Запрос вне транзакции повторяется, пока база занята."""
+        context = {"connection": mock.Mock(in_atomic_block=False)}
+        locked = OperationalError("database is locked")
+        execute = mock.Mock(side_effect=[locked, locked, "ok"])
+        with self.assertLogs("core.sqlite", "WARNING") as logs:
+            self.assertEqual(sqlite.retry_locked(
+                execute, "SELECT 1", None, False, context
+            ), "ok")
+        self.assertEqual(len(logs.records), 2)
+        execute = mock.Mock(side_effect=locked)
+        with self.assertLogs("core.sqlite", "WARNING"), \
+                self.assertRaises(OperationalError):
+            sqlite.retry_locked(execute, "SELECT 1", None, False, context)
+        self.assertEqual(execute.call_count, 3)
+
+    def test_begin_immediate(self):
+        """Транзакция сразу берет блокировку записи."""
+        context = {"connection": mock.Mock(in_atomic_block=False)}
+        execute = mock.Mock()
+        sqlite.retry_locked(execute, "BEGIN", None, False, context)
+        execute.assert_called_once_with("BEGIN IMMEDIATE", None, False,
+                                        context)
+
+    @override_settings(SQLITE_LOCK_RETRIES=2, SQLITE_RETRY_DELAY=0)
+    def test_no_retry_in_transaction(self):
+        """В транзакции и при других ошибках запрос не повторяется."""
+        for in_atomic, error in ((True, "database is locked"),
+                                 (False, "no such table: posts_post")):
+            with self.subTest(error=error):
+                context = {"connection": mock.Mock(in_atomic_block=in_atomic)}
+                execute = mock.Mock(side_effect=OperationalError(error))
+                with self.assertRaises(OperationalError):
+                    sqlite.retry_locked(execute, "SELECT 1", None, False,
+                                        context)
+                execute.assert_called_once()
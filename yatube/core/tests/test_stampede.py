@@ -0,0 +1,100 @@
+import threading
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.utils import make_template_fragment_key
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from core import stampede
+from posts import generations
+from posts.models import Post, User
+
+
+class StampedeTest(SimpleTestCase):
+    def setUp(self):
+        self.cache = LocMemCache("stampede-test", {})
+        self.addCleanup(self.cache.clear)
+
+    def test_single_flight(self):
+        """Одновременные промахи строят значение один раз."""
+        calls = []
+
+        def build():
+            calls.append(1)
+            time.sleep(0.2)
+            return "value"
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(
+            stampede.get_or_build("key", build, cache=self.cache)
+        )) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [("value", True)] * 8)
+
+    def test_stale_while_revalidate(self):
+        """Пока строит другой запрос, отдается прошлое поколение."""
+        stampede.get_or_build("key:1", lambda: "old", stale_key="key",
+                              cache=self.cache)
+        self.cache.add("key:2" + stampede.LOCK_SUFFIX, 1)
+        build = mock.Mock(return_value="new")
+        self.assertEqual(stampede.get_or_build(
+            "key:2", build, stale_key="key", cache=self.cache
+        ), ("old", False))
+        build.assert_not_called()
+
+    @override_settings(STAMPEDE_WAIT=1)
+    def test_wait_without_stale(self):
+        """Без устаревшей копии ждем значение от строящего запроса."""
+        self.cache.add("key" + stampede.LOCK_SUFFIX, 1)
+
+        def sleep(seconds):
+            self.cache.set("key", ("built", None, 0.1))
+
+        with mock.patch("core.stampede.time.sleep", sleep):
+            self.assertEqual(stampede.get_or_build(
+                "key", mock.Mock(), cache=self.cache
+            ), ("built", True))
+
+    def test_early_expiration(self):
+        """Значение пересчитывается до срока, если строится долго."""
+        self.cache.set("key", ("old", time.time() + 1, 3600))
+        self.assertEqual(stampede.get_or_build(
+            "key", lambda: "new", timeout=60, cache=self.cache
+        ), ("new", True))
+        self.cache.set("key", ("old", None, 3600))
+        self.assertEqual(stampede.get_or_build(
+            "key", lambda: "new", cache=self.cache
+        ), ("old", True))
+
+
+class StampedeFragmentTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="auth")
+        Post.objects.create(author=cls.user, text="Старый пост")
+
+    def setUp(self):
+        cache.clear()
+
+    def test_stale_fragment_not_cached(self):
+        """Страница с устаревшим фрагментом не попадает в кэш страниц."""
+        index = reverse("posts:index")
+        self.client.get(index)
+        Post.objects.create(author=self.user, text="Новый пост")
+        key = make_template_fragment_key("index_page", [
+            "", "", generations.versions(generations.INDEX),
+        ])
+        cache.add(key + stampede.LOCK_SUFFIX, 1)
+        response = self.client.get(index)
+        self.assertNotContains(response, "Новый пост")
+        self.assertFalse(response.has_header("ETag"))
+        cache.delete(key + stampede.LOCK_SUFFIX)
+        self.assertContains(self.client.get(index), "Новый пост")
@@ -0,0 +1,76 @@
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend as BaseThumbnailBackend
+from sorl.thumbnail.conf import settings
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.images import ImageFile
+
+from . import profiling
+
+
+class ThumbnailBackend(BaseThumbnailBackend):
+    """Бэкенд sorl-thumbnail с замером времени и раздельной генерацией.
+
+    Кроме обычного get_thumbnail умеет только найти готовые миниатюры
+    (cached_many), только записать файл миниатюры без KV-хранилища (render,
+    выполняется в фоновом процессе) и зарегистрировать готовый файл
+    (register, в основном процессе).
+    """
+
+    def get_thumbnail(self, file_, geometry_string, **options):
+        with profiling.timed("thumbnail", geometry_string):
+            return super().get_thumbnail(file_, geometry_string, **options)
+
+    def _create_thumbnail(self, source_image, geometry_string, options,
+                          thumbnail):
+        with profiling.timed("thumbnail_generate", geometry_string):
+            super()._create_thumbnail(source_image, geometry_string,
+                                      options, thumbnail)
+
+    def prepare(self, file_, geometry_string, options):
+        """Исходник, полный набор опций и файл миниатюры без генерации"""
+        source = ImageFile(file_)
+        options = dict(options)
+        if settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault("format", self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return source, options, ImageFile(name, default.storage)
+
+    def cached_many(self, requests):
+        """Готовые миниатюры для списка (исходник, геометрия, опции)
+        одним обращением к хранилищу, None для отсутствующих"""
+        with profiling.timed("thumbnail", "batch"):
+            thumbnails = [self.prepare(*request)[2] for request in requests]
+            found = default.kvstore.get_many(thumbnails)
+            return [found.get(thumbnail.key) for thumbnail in thumbnails]
+
+    def render(self, file_, geometry_string, **options):
+        """Пишем файл миниатюры, KV-хранилище не трогаем"""
+        source, options, thumbnail = self.prepare(file_, geometry_string,
+                                                  options)
+        if thumbnail.exists():
+            thumbnail.set_size()
+            return thumbnail
+        source_image = default.engine.get_image(source)
+        try:
+            options["image_info"] = default.engine.get_image_info(
+                source_image
+            )
+            self._create_thumbnail(source_image, geometry_string, options,
+                                   thumbnail)
+        finally:
+            default.engine.cleanup(source_image)
+        return thumbnail
+
+    def register(self, file_, geometry_string, size, **options):
+        """Заносим готовый файл миниатюры в KV-хранилище"""
+        source, _, thumbnail = self.prepare(file_, geometry_string, options)
+        thumbnail.set_size(size)
+        default.kvstore.get_or_set(source)
+        default.kvstore.set(thumbnail, source)
+        return thumbnail
@@ -1,18 +1,93 @@
 from django.contrib import admin
+from django.contrib.admin.widgets import AutocompleteSelect
 
+from . import search
 from .models import Group, Post, Comment, Follow
+from .pagination import EstimatedCountPaginator
+from .settings import ADMIN_COUNT_LIMIT
+
+
+class RowAutocompleteSelect(AutocompleteSelect):
+    """Автодополнение, которое берет подпись выбранного значения
+    из уже загруженного объекта строки, а не отдельным запросом"""
+
+    selected = None
+
+    def optgroups(self, name, value, attr=None):
+        if self.selected is None or [str(self.selected.pk)] != value:
+            return super().optgroups(name, value, attr)
+        options = []
+        if not self.is_required:
+            options.append(self.create_option(name, '', '', False, 0))
+        options.append(self.create_option(
+            name, self.selected.pk,
+            self.choices.field.label_from_instance(self.selected),
+            True, len(options),
+        ))
+        return [(None, options, 0)]
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Админка таблицы в миллионы строк.
+
+    Без полного COUNT(*), а связанные поля из list_editable
+    с автодополнением не делают запрос на каждую строку.
+    """
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_paginator(self, request, queryset, per_page, orphans=0,
+                      allow_empty_first_page=True):
+        return self.paginator(queryset, per_page, orphans=orphans,
+                              allow_empty_first_page=allow_empty_first_page,
+                              count_limit=ADMIN_COUNT_LIMIT)
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name in self.get_autocomplete_fields(request):
+            kwargs.setdefault('widget', RowAutocompleteSelect(
+                db_field.remote_field, self.admin_site,
+                using=kwargs.get('using'),
+            ))
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+    def get_changelist_form(self, request, **kwargs):
+        form_class = super().get_changelist_form(request, **kwargs)
+        names = [name for name in self.list_editable
+                 if name in self.get_autocomplete_fields(request)]
+
+        class ChangeListForm(form_class):
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+                for name in names:
+                    widget = self.fields[name].widget
+                    getattr(widget, 'widget', widget).selected = getattr(
+                        self.instance, name
+                    )
+
+        return ChangeListForm
 
 
 @admin.register(Post)
-class PostAdmin(admin.ModelAdmin):
+class PostAdmin(LargeTableAdmin):
     """Отображение модели в интерфейсе админки"""
 
     list_display = ('pk', 'text', 'pub_date', 'author', 'group',)
     list_editable = ('group',)
+    list_select_related = ('author', 'group')
+    autocomplete_fields = ('author', 'group')
     search_fields = ('text',)
     list_filter = ('pub_date',)
+    date_hierarchy = 'pub_date'
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        """Поиск по индексу полнотекстового поиска вместо LIKE"""
+        if not search_term:
+            return queryset, False
+        found = search.search(search_term).order_by().values('pk')
+        return queryset.filter(pk__in=found), False
+
 
 @admin.register(Group)
 class GroupAdmin(admin.ModelAdmin):
@@ -20,22 +95,28 @@ class GroupAdmin(admin.ModelAdmin):
 
     list_display = ('pk', 'title', 'slug', 'description',)
     list_filter = ('slug',)
+    search_fields = ('title', 'slug')
     empty_value_display = '-пусто-'
 
 
 @admin.register(Comment)
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(LargeTableAdmin):
     """Отображение модели в интерфейсе админки"""
 
     list_display = ('pk', 'post', 'author', 'text', 'created')
+    list_select_related = ('post', 'author')
+    autocomplete_fields = ('post', 'author')
     list_filter = ('created',)
     search_fields = ('text',)
+    date_hierarchy = 'created'
     empty_value_display = '-пусто-'
 
 
 @admin.register(Follow)
-class FollowAdmin(admin.ModelAdmin):
+class FollowAdmin(LargeTableAdmin):
     """Отображение модели в интерфейсе админки"""
 
     list_display = ('author', 'user')
+    list_select_related = ('author', 'user')
+    autocomplete_fields = ('author', 'user')
     empty_value_display = '-пусто-'
@@ -0,0 +1,46 @@
+"""Кэш отрисованных карточек постов для лент.
+
+Ключ карточки складывается из id поста и его версии. Версию сдвигают
+правка поста, готовые миниатюры, смена имени автора и изменение группы,
+поэтому старые карточки просто перестают читаться. Карточки страницы
+достаются из кэша одним get_many.
+"""
+from django.core.cache import cache
+from django.utils.safestring import mark_safe
+
+from . import thumbnails
+from .settings import POST_CARD_TIMEOUT
+
+TEMPLATE = "includes/post.html"
+KIND = "feed"
+
+
+def key(post):
+    return f"posts:card:{post.pk}:{post.version}"
+
+
+def prefetch(posts):
+    """Достаем карточки страницы; для недостающих — миниатюры"""
+    posts = list(posts)
+    found = cache.get_many([key(post) for post in posts])
+    missing = []
+    for post in posts:
+        html = found.get(key(post))
+        if html is None:
+            missing.append(post)
+        else:
+            post.__dict__["_card"] = html
+    thumbnails.prefetch(missing, KIND)
+
+
+def render(context, post):
+    """Карточка из предвыборки или кэша, иначе рисуем и кэшируем"""
+    html = post.__dict__.get("_card")
+    if html is None:
+        html = cache.get(key(post))
+    if html is None:
+        template = context.template.engine.get_template(TEMPLATE)
+        with context.push(post=post):
+            html = template.render(context)
+        cache.set(key(post), html, POST_CARD_TIMEOUT)
+    return mark_safe(html)
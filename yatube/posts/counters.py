@@ -0,0 +1,95 @@
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import AuthorStats, Comment, Follow, Post, User
+from .settings import (COUNTERS_BATCH_SIZE, FEED_CELEBRITY_DEMOTE_FOLLOWERS,
+                       FEED_CELEBRITY_FOLLOWERS)
+
+
+def change(author_id, **deltas):
+    """Сдвигаем счетчики автора на заданные величины.
+
+    Уменьшение не опускает счетчик ниже нуля и не создает строку:
+    при каскадном удалении пользователя ее уже может не быть.
+    """
+    if any(delta > 0 for delta in deltas.values()):
+        AuthorStats.objects.get_or_create(author_id=author_id)
+    for field, delta in deltas.items():
+        stats = AuthorStats.objects.filter(author_id=author_id)
+        if delta < 0:
+            stats = stats.filter(**{f"{field}__gte": -delta})
+        stats.update(**{field: F(field) + delta})
+
+
+def change_comments(post_id, delta):
+    """Сдвигаем счетчик комментариев поста"""
+    posts = Post.objects.filter(pk=post_id)
+    if delta < 0:
+        posts = posts.filter(comments_count__gte=-delta)
+    posts.update(comments_count=F("comments_count") + delta)
+
+
+def stats(author):
+    """Счетчики автора одной строкой по первичному ключу"""
+    return AuthorStats.objects.get_or_create(author=author)[0]
+
+
+def _grouped(queryset, field):
+    return dict(
+        queryset.values_list(field).annotate(total=Count("pk")).order_by()
+    )
+
+
+def _flags(followers, was_celebrity, was_pending):
+    """Признак популярности и отметка о неразложенных лентах"""
+    if was_celebrity:
+        celebrity = followers >= FEED_CELEBRITY_DEMOTE_FOLLOWERS
+    else:
+        celebrity = followers >= FEED_CELEBRITY_FOLLOWERS
+    return {"celebrity": celebrity,
+            "feed_pending": was_pending or celebrity != was_celebrity}
+
+
+@transaction.atomic
+def rebuild():
+    """Пересчитываем все счетчики по таблицам постов и подписок
+    и признаки популярных авторов"""
+    posts = _grouped(Post.objects, "author")
+    comments = _grouped(Comment.objects, "author")
+    followers = _grouped(Follow.objects, "author")
+    following = _grouped(Follow.objects, "user")
+    # Популярный автор остается популярным, пока не опустится ниже
+    # FEED_CELEBRITY_DEMOTE_FOLLOWERS, как в feed.unfollow; сменивший
+    # признак автор ждет feed.relayout или feed.rebuild.
+    flags = {
+        author_id: (celebrity, pending)
+        for author_id, celebrity, pending in AuthorStats.objects.filter(
+            Q(celebrity=True) | Q(feed_pending=True)
+        ).values_list("author_id", "celebrity", "feed_pending")
+    }
+    AuthorStats.objects.all().delete()
+    AuthorStats.objects.bulk_create(
+        (
+            AuthorStats(
+                author_id=author_id,
+                posts_count=posts.get(author_id, 0),
+                comments_count=comments.get(author_id, 0),
+                followers_count=followers.get(author_id, 0),
+                following_count=following.get(author_id, 0),
+                **_flags(followers.get(author_id, 0),
+                         *flags.get(author_id, (False, False))),
+            )
+            for author_id in User.objects.values_list(
+                "pk", flat=True
+            ).iterator(chunk_size=COUNTERS_BATCH_SIZE)
+        ),
+        batch_size=COUNTERS_BATCH_SIZE,
+    )
+    Post.objects.update(comments_count=Coalesce(
+        Subquery(
+            Comment.objects.filter(post=OuterRef("pk")).order_by()
+            .values("post").annotate(total=Count("pk")).values("total")
+        ),
+        0,
+    ))
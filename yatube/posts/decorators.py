@@ -0,0 +1,81 @@
+from functools import wraps
+from hashlib import md5
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag, urlencode
+
+from core import replicas, stampede
+
+from . import generations
+from .settings import CURSOR_PARAM, PAGE_CACHE_TIMEOUT
+
+# Параметры запроса, от которых зависит страница; остальные
+# (utm-метки и прочее) в ключ кэша не попадают.
+PAGE_PARAMS = ("page", CURSOR_PARAM)
+
+
+def _cacheable(request, response):
+    """Кэшируем только готовые страницы без cookies и CSRF-форм
+    и без фрагментов, отданных из устаревшей копии"""
+    return (
+        response.status_code == 200
+        and not stampede.served_stale(request)
+        and not response.streaming
+        and not response.cookies
+        and not request.META.get("CSRF_COOKIE_USED")
+    )
+
+
+def _page_key(request):
+    """Адрес страницы и отсортированные значения параметров PAGE_PARAMS"""
+    params = sorted(
+        (name, request.GET[name]) for name in PAGE_PARAMS
+        if name in request.GET
+    )
+    return md5(f"{request.path}?{urlencode(params)}".encode()).hexdigest()
+
+
+def cache_anonymous_page(scopes):
+    """Кэш целых страниц для анонимных посетителей.
+
+    scopes получает аргументы view и возвращает области поколений,
+    от которых зависит страница, или None, если кэшировать нечего.
+    Ключ складывается из пути, значений page/cursor и поколений,
+    поэтому страницу сбрасывают те же сигналы, что и фрагменты.
+    Ответ получает ETag и Last-Modified для условных запросов.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if (request.method not in ("GET", "HEAD")
+                    or request.user.is_authenticated):
+                return view(request, *args, **kwargs)
+            page_scopes = scopes(*args, **kwargs)
+            if not page_scopes:
+                return view(request, *args, **kwargs)
+            version = generations.versions(*page_scopes)
+            key = f"posts:page:{_page_key(request)}:{version}"
+            etag = quote_etag(md5(key.encode()).hexdigest())
+            last_modified = int(generations.modified(version).timestamp())
+            response = get_conditional_response(
+                request, etag=etag, last_modified=last_modified
+            )
+            if response is not None:
+                return response
+            entry = cache.get(key)
+            if entry is None:
+                response = view(request, *args, **kwargs)
+                if not _cacheable(request, response):
+                    return response
+                cache.set(key, (response.content, response["Content-Type"]),
+                          replicas.cache_timeout(PAGE_CACHE_TIMEOUT))
+            else:
+                content, content_type = entry
+                response = HttpResponse(content, content_type=content_type)
+            response["ETag"] = etag
+            response["Last-Modified"] = http_date(last_modified)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,274 @@
+import heapq
+from itertools import islice
+
+from django.db import connection, transaction
+from django.db.models import F, Q
+
+from .models import AuthorStats, FeedEntry, Follow, Post
+from .pagination import FEED_ORDERING
+from .settings import (FEED_BATCH_SIZE, FEED_CELEBRITY_DEMOTE_FOLLOWERS,
+                       FEED_CELEBRITY_FOLLOWERS)
+
+
+# Ключ ленты подписок: дата и пост записи FeedEntry (см. inbox).
+INBOX_ORDERING = ("-entry_date", "-entry_post")
+
+LISTING_FIELDS = (
+    "text", "pub_date", "image", "comments_count", "version",
+    "author", "author__username", "author__first_name",
+    "author__last_name",
+    "group", "group__slug", "group__title",
+)
+
+
+def for_listing(posts):
+    """Готовим queryset постов для ленты.
+
+    Автор и группа подтягиваются одним JOIN, из таблиц читаются только
+    колонки, нужные includes/post.html, а число комментариев берется
+    из денормализованного счетчика без агрегации.
+    """
+    return posts.select_related("author", "group").only(*LISTING_FIELDS)
+
+
+def _entries(rows):
+    """Пишем записи лент пачками, повторы игнорируем"""
+    FeedEntry.objects.bulk_create(
+        (FeedEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+         for user_id, post_id, pub_date in rows),
+        batch_size=FEED_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def followers_count(author_id):
+    return Follow.objects.filter(author_id=author_id).count()
+
+
+def is_celebrity(author_id):
+    """Посты популярного автора читаются при запросе, а не из лент"""
+    return AuthorStats.objects.filter(author_id=author_id,
+                                      celebrity=True).exists()
+
+
+def _insert(where, params):
+    """Раскладываем посты по лентам подписчиков одним INSERT ... SELECT.
+
+    where — условие на подписку f и пост p.
+    """
+    entry, follow, post = (model._meta.db_table
+                           for model in (FeedEntry, Follow, Post))
+    ops = connection.ops
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"{ops.insert_statement(ignore_conflicts=True)} {entry} "
+            "(user_id, post_id, pub_date) "
+            f"SELECT f.user_id, p.id, p.pub_date FROM {follow} f "
+            f"JOIN {post} p ON p.author_id = f.author_id WHERE {where} "
+            f"{ops.ignore_conflicts_suffix_sql(ignore_conflicts=True)}",
+            params,
+        )
+
+
+def fan_out(post):
+    """Раскладываем новый пост по лентам всех подписчиков автора"""
+    if is_celebrity(post.author_id):
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list("user_id", flat=True)
+    _entries(
+        (user_id, post.pk, post.pub_date)
+        for user_id in followers.iterator(chunk_size=FEED_BATCH_SIZE)
+    )
+
+
+def backfill(user_id, author_id):
+    """Добавляем в ленту подписчика уже опубликованные посты автора"""
+    _insert("f.user_id = %s AND f.author_id = %s", [user_id, author_id])
+
+
+def prune(user_id, author_id):
+    """Убираем из ленты подписчика посты автора после отписки"""
+    FeedEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id
+    ).delete()
+
+
+def follow(user_id, author_id):
+    """Обновляем ленты после новой подписки.
+
+    Автор, набравший FEED_CELEBRITY_FOLLOWERS подписчиков, становится
+    популярным: запрос лишь меняет признак, а записи лент автора
+    удаляет relayout вне запроса.
+    """
+    if is_celebrity(author_id):
+        return
+    if followers_count(author_id) < FEED_CELEBRITY_FOLLOWERS:
+        backfill(user_id, author_id)
+        return
+    AuthorStats.objects.get_or_create(author_id=author_id)
+    AuthorStats.objects.filter(author_id=author_id, celebrity=False).update(
+        celebrity=True, feed_pending=True
+    )
+
+
+def unfollow(user_id, author_id):
+    """Обновляем ленты после отписки.
+
+    Популярный автор снова раскладывается по лентам, только когда
+    подписчиков стало меньше FEED_CELEBRITY_DEMOTE_FOLLOWERS: отписка
+    и подписка на границе не гоняют ленты туда и обратно. Запрос лишь
+    меняет признак, ленты подписчиков заполняет relayout.
+    """
+    prune(user_id, author_id)
+    if followers_count(author_id) >= FEED_CELEBRITY_DEMOTE_FOLLOWERS:
+        return
+    AuthorStats.objects.filter(author_id=author_id, celebrity=True).update(
+        celebrity=False, feed_pending=True
+    )
+
+
+def relayout():
+    """Перекладываем ленты авторов, у которых сменился признак.
+
+    Популярного автора убираем из всех лент, обычного раскладываем
+    по лентам всех подписчиков одним INSERT ... SELECT. Запускается
+    командой relayout_feeds по расписанию. Если признак успел
+    смениться еще раз, отметка остается до следующего запуска.
+    Возвращает число переложенных авторов.
+    """
+    done = 0
+    pending = AuthorStats.objects.filter(feed_pending=True).values_list(
+        "author_id", "celebrity"
+    )
+    for author_id, celebrity in pending:
+        with transaction.atomic():
+            if celebrity:
+                FeedEntry.objects.filter(post__author_id=author_id).delete()
+            else:
+                _insert("f.author_id = %s", [author_id])
+            done += AuthorStats.objects.filter(
+                author_id=author_id, celebrity=celebrity
+            ).update(feed_pending=False)
+    return done
+
+
+def rebuild():
+    """Заполняем ленты всех подписчиков одним INSERT ... SELECT.
+
+    Нужен после загрузок через bulk_create, которые не шлют сигналы.
+    Признаки популярности берутся из счетчиков: counters.rebuild()
+    вызывается раньше.
+    """
+    FeedEntry.objects.filter(post__author__stats__celebrity=True).delete()
+    _insert(
+        f"NOT EXISTS (SELECT 1 FROM {AuthorStats._meta.db_table} s "
+        "WHERE s.author_id = f.author_id AND s.celebrity)",
+        [],
+    )
+    AuthorStats.objects.filter(feed_pending=True).update(feed_pending=False)
+
+
+def inbox(user):
+    """Посты ленты подписок в порядке индекса (user, -pub_date, -post).
+
+    Ключ сортировки берется из колонок FeedEntry, а не поста: тогда
+    и OFFSET-, и курсорные страницы читаются по индексу без сортировки.
+    """
+    posts = Post.objects.filter(feed_entries__user=user).annotate(
+        entry_date=F("feed_entries__pub_date"),
+        entry_post=F("feed_entries__post"),
+    )
+    return for_listing(posts).order_by(*INBOX_ORDERING)
+
+
+def celebrities_followed(user):
+    """Авторы из подписок, чьи посты подмешиваются при чтении.
+
+    Пары (автор, ждет ли перекладки): популярные авторы и авторы,
+    чьи ленты еще не переложил relayout.
+    """
+    return Follow.objects.filter(
+        Q(author__stats__celebrity=True)
+        | Q(author__stats__feed_pending=True),
+        user=user,
+    ).values_list("author", "author__stats__feed_pending")
+
+
+def follow_feed(user):
+    """Лента подписок: входящие записи плюс посты популярных авторов"""
+    followed = list(celebrities_followed(user))
+    if not followed:
+        return inbox(user)
+    celebrities = [author_id for author_id, _ in followed]
+    # Записи лент автора, ждущего перекладки, неполны или лишние:
+    # его посты целиком читаются из таблицы постов.
+    pending = [author_id for author_id, waits in followed if waits]
+    entries = inbox(user)
+    if pending:
+        entries = entries.exclude(author_id__in=pending)
+    # У постов популярных авторов ключ ленты — их собственные колонки.
+    return HybridFeed(
+        entries,
+        *(for_listing(Post.objects.filter(author_id=author_id).annotate(
+            entry_date=F("pub_date"), entry_post=F("pk"),
+        )) for author_id in celebrities),
+        ordering=INBOX_ORDERING,
+    )
+
+
+class HybridFeed:
+    """Слияние нескольких отсортированных querysets постов.
+
+    Каждый срез читает из каждого источника не больше нужного числа
+    строк и склеивает их k-путевым слиянием по ключу сортировки, так
+    что объект подходит и для Paginator, и для KeysetPaginator.
+    """
+
+    def __init__(self, *querysets, ordering=FEED_ORDERING):
+        self.ordering = ordering
+        self.querysets = [qs.order_by(*ordering) for qs in querysets]
+        self.model = self.querysets[0].model
+
+    @property
+    def query(self):
+        return self.querysets[0].query
+
+    def order_by(self, *ordering):
+        return HybridFeed(*self.querysets, ordering=ordering)
+
+    def filter(self, *args, **kwargs):
+        return HybridFeed(
+            *(qs.filter(*args, **kwargs) for qs in self.querysets),
+            ordering=self.ordering,
+        )
+
+    def count(self):
+        return sum(qs.count() for qs in self.querysets)
+
+    def _key(self, post):
+        return tuple(getattr(post, field.lstrip("-"))
+                     for field in self.ordering)
+
+    def __iter__(self):
+        return iter(self[:])
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start = index.start or 0
+        stop = index.stop
+        streams = [qs if stop is None else qs[:stop]
+                   for qs in self.querysets]
+        merged = heapq.merge(
+            *streams, key=self._key,
+            reverse=self.ordering[0].startswith("-"),
+        )
+        seen = set()
+        unique = (post for post in merged
+                  if not (post.pk in seen or seen.add(post.pk)))
+        return list(islice(unique, start, stop))
@@ -1,6 +1,8 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
 
-from .models import Post, Comment
+from . import images
+from .models import Comment, Group, Post
 
 
 class PostForm(forms.ModelForm):
@@ -13,6 +15,12 @@ class PostForm(forms.ModelForm):
             'text': "Текст поста",
             'group': "Группа"}
 
+    def clean_image(self):
+        image = self.cleaned_data['image']
+        if isinstance(image, UploadedFile):
+            return images.process(image)
+        return image
+
 
 class CommentForm(forms.ModelForm):
     """Форма модели комментария"""
@@ -23,3 +31,14 @@ class CommentForm(forms.ModelForm):
         labels = {
             'text': 'Добавить комментарий'}
         help_texts = {'text': 'Текст комментария'}
+
+
+class SearchForm(forms.Form):
+    """Форма поиска по постам и комментариям"""
+
+    q = forms.CharField(label="Поиск", max_length=200)
+    group = forms.ModelChoiceField(
+        Group.objects.all(), label="Группа", required=False,
+        to_field_name="slug"
+    )
+    author = forms.CharField(label="Автор", max_length=150, required=False)
@@ -0,0 +1,71 @@
+"""Поколения кэша лент.
+
+Ключ фрагмента включает поколения всех областей, от которых зависит
+его содержимое. Сигналы моделей сдвигают поколение области, и старые
+фрагменты просто перестают читаться, поэтому их можно хранить без
+срока жизни. Поколение начинается с времени сдвига, из него же
+выводится Last-Modified закэшированных страниц.
+"""
+import time
+from datetime import datetime, timezone
+from uuid import uuid4
+
+from django.core.cache import cache
+
+INDEX = "index"
+GROUPS = "groups"
+# Поколение графа подписок (posts.graph).
+GRAPH = "graph"
+PREFIX = "posts:generation:"
+
+
+def group(group_id):
+    return f"group:{group_id}"
+
+
+def profile(author_id):
+    return f"profile:{author_id}"
+
+
+def stats(author_id):
+    return f"stats:{author_id}"
+
+
+def post(post_id):
+    return f"post:{post_id}"
+
+
+def _token():
+    return f"{time.time_ns():x}-{uuid4().hex[:6]}"
+
+
+def tokens(*scopes):
+    """Текущие поколения областей, недостающие заводятся заново"""
+    keys = [PREFIX + scope for scope in scopes]
+    found = cache.get_many(keys)
+    missing = {key: _token() for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, None)
+    found.update(missing)
+    return [found[key] for key in keys]
+
+
+def versions(*scopes):
+    """Строка поколений для ключа фрагмента"""
+    return ".".join(tokens(*scopes))
+
+
+def modified(versions_string):
+    """Время последнего сдвига среди поколений строки versions"""
+    latest = max(int(token.split("-")[0], 16)
+                 for token in versions_string.split("."))
+    return datetime.fromtimestamp(latest / 1e9, tz=timezone.utc)
+
+
+def bump(*scopes):
+    """Сдвигаем поколения областей, устаревшие фрагменты не читаются"""
+    scopes = [scope for scope in scopes if scope]
+    if scopes:
+        cache.set_many(
+            {PREFIX + scope: _token() for scope in scopes}, None
+        )
@@ -0,0 +1,127 @@
+"""Граф подписок в кэше.
+
+Для каждого пользователя хранятся два отсортированных массива id:
+на кого он подписан и кто подписан на него, поэтому проверка
+подписки на странице не требует SQL. Сигналы Follow после фиксации
+транзакции удаляют оба затронутых массива, и следующее чтение берет
+их из базы: правка на месте теряла бы изменения параллельных запросов.
+Массивы помечены поколением графа: массовая загрузка подписок
+в обход сигналов сдвигает его, и все массивы перечитываются из базы.
+"""
+from array import array
+from bisect import bisect_left
+
+from django.core.cache import cache
+from django.db import transaction
+
+from core import replicas
+
+from . import generations
+from .models import Follow
+from .settings import GRAPH_TIMEOUT
+
+FOLLOWEES = "followees"
+FOLLOWERS = "followers"
+# Колонка Follow, по которой ищутся массивы, и колонка их значений.
+COLUMNS = {
+    FOLLOWEES: ("user", "author"),
+    FOLLOWERS: ("author", "user"),
+}
+GENERATION_KEY = generations.PREFIX + generations.GRAPH
+
+
+def _id(user):
+    return getattr(user, "pk", user)
+
+
+def _key(direction, user_id):
+    return f"posts:graph:{direction}:{user_id}"
+
+
+def _load(direction, user_ids):
+    """Массивы по направлению: {id: array} одним запросом к кэшу"""
+    user_ids = list(dict.fromkeys(user_ids))
+    keys = {_key(direction, user_id): user_id for user_id in user_ids}
+    found = cache.get_many([GENERATION_KEY, *keys])
+    generation = found.pop(GENERATION_KEY, None)
+    if generation is None:
+        generation = generations.tokens(generations.GRAPH)[0]
+    result = {keys[key]: ids for key, (token, ids) in found.items()
+              if token == generation}
+    missing = [user_id for user_id in user_ids if user_id not in result]
+    if not missing:
+        return result
+    by, value = COLUMNS[direction]
+    rows = Follow.objects.filter(**{f"{by}__in": missing}).order_by(
+        by, value
+    ).values_list(by, value)
+    loaded = {user_id: array("q") for user_id in missing}
+    for user_id, other_id in rows:
+        loaded[user_id].append(other_id)
+    cache.set_many(
+        {_key(direction, user_id): (generation, ids)
+         for user_id, ids in loaded.items()},
+        replicas.cache_timeout(GRAPH_TIMEOUT),
+    )
+    result.update(loaded)
+    return result
+
+
+def _contains(ids, value):
+    index = bisect_left(ids, value)
+    return index < len(ids) and ids[index] == value
+
+
+def followees_many(users):
+    """{id пользователя: отсортированный массив id его авторов}"""
+    return _load(FOLLOWEES, map(_id, users))
+
+
+def followers_many(authors):
+    """{id автора: отсортированный массив id его подписчиков}"""
+    return _load(FOLLOWERS, map(_id, authors))
+
+
+def followees(user):
+    return followees_many([user])[_id(user)]
+
+
+def followers(author):
+    return followers_many([author])[_id(author)]
+
+
+def is_following_many(user, authors):
+    """{id автора: подписан ли пользователь} для всех авторов разом"""
+    author_ids = list(map(_id, authors))
+    if user is None or not getattr(user, "is_authenticated", True):
+        return dict.fromkeys(author_ids, False)
+    ids = followees(user)
+    return {author_id: _contains(ids, author_id) for author_id in author_ids}
+
+
+def is_following(user, author):
+    return is_following_many(user, [author])[_id(author)]
+
+
+def forget(user_id, author_id):
+    """Удаляем массивы подписки после фиксации транзакции.
+
+    При откате транзакции кэш не трогается.
+    """
+    keys = [_key(FOLLOWEES, user_id), _key(FOLLOWERS, author_id)]
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def page_authors(user, posts):
+    """Авторы постов страницы и подписан ли на них пользователь.
+
+    Пары (автор, подписка) без повторов и без самого пользователя.
+    Для анонима страница не читается вовсе.
+    """
+    if user is None or not user.is_authenticated:
+        return []
+    authors = {post.author_id: post.author for post in posts
+               if post.author_id != user.pk}
+    following = is_following_many(user, authors)
+    return [(author, following[author_id])
+            for author_id, author in authors.items()]
@@ -0,0 +1,132 @@
+import os
+import tempfile
+
+from django.conf import settings as django_settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
+from PIL import Image, ImageOps, ImageSequence
+
+from . import settings
+
+# Эти форматы draft() декодирует сразу в уменьшенном масштабе.
+DRAFT_FORMATS = {"JPEG"}
+IMAGE_TOO_LARGE = "Картинка слишком большая: {width}×{height} пикселей"
+IMAGE_BROKEN = "Не удалось прочитать картинку: файл поврежден"
+# Ключи info, под которыми Pillow отдает метаданные GIF.
+GIF_METADATA = ("comment", "xmp", "icc_profile", "exif", "extension")
+
+
+def _has_alpha(image):
+    return image.mode in ("RGBA", "LA", "PA") or (
+        image.mode == "P" and "transparency" in image.info
+    )
+
+
+def _check_size(image):
+    """Отклоняем картинку, которую не декодировать в разумной памяти.
+
+    JPEG декодируется через draft(), для него хватает IMAGE_MAX_PIXELS.
+    Остальные форматы декодируются целиком, вместе со всеми кадрами
+    анимации, поэтому для них предел ниже - IMAGE_MAX_DECODED_PIXELS.
+    """
+    width, height = image.size
+    if image.format in DRAFT_FORMATS:
+        pixels, limit = width * height, settings.IMAGE_MAX_PIXELS
+    else:
+        pixels = width * height * getattr(image, "n_frames", 1)
+        limit = settings.IMAGE_MAX_DECODED_PIXELS
+    if pixels > limit:
+        raise ValidationError(
+            IMAGE_TOO_LARGE.format(width=width, height=height),
+            code="image_too_large",
+        )
+
+
+def _plain_gif(image):
+    """Статичный GIF в пределах размера и без метаданных.
+
+    Перекодирование такого файла ничего не убирает и только
+    перестраивает палитру, поэтому он сохраняется как есть.
+    """
+    width, height = image.size
+    max_width, max_height = settings.IMAGE_MAX_SIZE
+    return (
+        image.format == "GIF"
+        and not getattr(image, "is_animated", False)
+        and width <= max_width and height <= max_height
+        and not any(key in image.info for key in GIF_METADATA)
+    )
+
+
+def _animation(image):
+    """Уменьшаем кадры анимации, метаданные кадров не переносим."""
+    frames, durations = [], []
+    for frame in ImageSequence.Iterator(image):
+        durations.append(frame.info.get("duration", 0))
+        frame = frame.convert("RGBA")
+        frame.thumbnail(settings.IMAGE_MAX_SIZE, Image.LANCZOS)
+        frame.info = {}
+        frames.append(frame)
+    return frames[0], "gif", {
+        "format": "GIF",
+        "save_all": True,
+        "append_images": frames[1:],
+        "duration": durations,
+        "loop": image.info.get("loop", 0),
+        "disposal": 2,
+        "optimize": True,
+    }
+
+
+def _still(image):
+    """Уменьшаем картинку и выбираем формат по наличию прозрачности."""
+    image.draft("RGB", settings.IMAGE_MAX_SIZE)
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail(settings.IMAGE_MAX_SIZE, Image.LANCZOS)
+    if _has_alpha(image):
+        return image.convert("RGBA"), "png", {"format": "PNG",
+                                              "optimize": True}
+    return image.convert("RGB"), "jpg", {
+        "format": "JPEG",
+        "quality": settings.IMAGE_JPEG_QUALITY,
+        "optimize": True,
+        "progressive": True,
+    }
+
+
+def process(upload):
+    """Уменьшаем картинку, убираем метаданные и перекодируем.
+
+    Размеры проверяются по заголовку до декодирования пикселей.
+    Анимация пересобирается покадрово и остается GIF. Результат больше
+    FILE_UPLOAD_MAX_MEMORY_SIZE уходит во временный файл на диске.
+    Поврежденный файл, который прошел проверку ImageField,
+    отклоняется здесь, при декодировании.
+    """
+    upload.seek(0)
+    output = tempfile.SpooledTemporaryFile(
+        max_size=django_settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+    )
+    try:
+        with Image.open(upload) as image:
+            _check_size(image)
+            if _plain_gif(image):
+                output.close()
+                upload.seek(0)
+                return upload
+            if getattr(image, "is_animated", False):
+                result, extension, options = _animation(image)
+            else:
+                result, extension, options = _still(image)
+            result.save(output, **options)
+    except (OSError, EOFError, Image.DecompressionBombError):
+        output.close()
+        raise ValidationError(IMAGE_BROKEN, code="image_broken")
+    except ValidationError:
+        output.close()
+        raise
+    name = f"{os.path.splitext(upload.name)[0]}.{extension}"
+    size = output.tell()
+    output.seek(0)
+    return UploadedFile(output, name,
+                        f"image/{options['format'].lower()}", size)
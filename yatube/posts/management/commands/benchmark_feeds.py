@@ -0,0 +1,104 @@
+import json
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Follow, Group, Post, User
+
+
+def percentile(values, share):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * share))]
+
+
+class Command(BaseCommand):
+    help = ("Прогоняет страницы лент через тестовый клиент и сохраняет "
+            "p50/p99, число запросов и размер ответа в JSON")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=50)
+        parser.add_argument("--output", default="feed_benchmark.json")
+        parser.add_argument("--compare",
+                            help="JSON прошлого прогона для сравнения")
+        parser.add_argument("--warm", action="store_true",
+                            help="Не очищать кэш перед запросами")
+
+    def handle(self, *args, **options):
+        results = {}
+        for name, client, url in self.cases():
+            results[name] = self.measure(client, url, options)
+            self.stdout.write(
+                "{name:<14} p50 {p50_ms:8.2f} ms  p99 {p99_ms:8.2f} ms  "
+                "{queries:3d} q  {bytes:8d} B".format(name=name,
+                                                      **results[name])
+            )
+        with open(options["output"], "w") as output:
+            json.dump(results, output, indent=2, ensure_ascii=False)
+        if options["compare"]:
+            self.compare(results, options["compare"])
+
+    def cases(self):
+        """Самые тяжелые представители каждой ленты"""
+        anonymous = Client()
+        reader = User.objects.annotate(
+            follows=Count("follower")
+        ).order_by("-follows").first()
+        author = User.objects.annotate(
+            total=Count("posts")
+        ).order_by("-total").first()
+        group = Group.objects.annotate(
+            total=Count("posts")
+        ).order_by("-total").first()
+        post = Post.objects.order_by("-comments_count").first()
+        if post is None:
+            return
+        deep_page = Post.objects.count() // 10 // 2 or 1
+        yield "index", anonymous, reverse("posts:index")
+        yield "index_deep", anonymous, (
+            reverse("posts:index") + f"?page={deep_page}"
+        )
+        if group:
+            yield "group", anonymous, reverse("posts:group_list",
+                                              args=[group.slug])
+        yield "profile", anonymous, reverse("posts:profile",
+                                            args=[author.username])
+        yield "post_detail", anonymous, reverse("posts:post_detail",
+                                                args=[post.pk])
+        if Follow.objects.filter(user=reader).exists():
+            client = Client()
+            client.force_login(reader)
+            yield "follow_index", client, reverse("posts:follow_index")
+
+    def measure(self, client, url, options):
+        timings = []
+        for _ in range(options["requests"]):
+            if not options["warm"]:
+                cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                response = client.get(url)
+                timings.append((time.perf_counter() - start) * 1000)
+        return {
+            "url": url,
+            "p50_ms": round(percentile(timings, 0.5), 3),
+            "p99_ms": round(percentile(timings, 0.99), 3),
+            "queries": len(queries),
+            "bytes": len(response.content),
+        }
+
+    def compare(self, results, path):
+        with open(path) as baseline_file:
+            baseline = json.load(baseline_file)
+        for name, result in results.items():
+            if name not in baseline:
+                continue
+            before = baseline[name]["p50_ms"]
+            change = (result["p50_ms"] - before) / before * 100
+            self.stdout.write(f"{name:<14} p50 {change:+.1f}% "
+                              f"({before} -> {result['p50_ms']} ms)")
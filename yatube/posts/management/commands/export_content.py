@@ -0,0 +1,40 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = "Выгружает группы, посты, комментарии или подписки в JSONL/CSV"
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=transfer.COLUMNS)
+        parser.add_argument("path", help="Файл или - для stdout")
+        parser.add_argument("--format", choices=transfer.FORMATS,
+                            default=None,
+                            help="По умолчанию - по расширению файла")
+        parser.add_argument("--chunk-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        format_ = options["format"] or (
+            transfer.CSV if path.endswith(".csv") else transfer.JSONL
+        )
+        rows = transfer.export_rows(options["kind"], options["chunk_size"])
+        started = time.perf_counter()
+        if path == "-":
+            count = transfer.write_rows(options["kind"], rows, sys.stdout,
+                                        format_)
+            report = self.stderr
+        else:
+            with open(path, "w", encoding="utf-8", newline="") as file:
+                count = transfer.write_rows(options["kind"], rows, file,
+                                            format_)
+            report = self.stdout
+        elapsed = time.perf_counter() - started
+        report.write(self.style.SUCCESS(
+            f"Выгружено строк: {count} за {elapsed:.1f} с "
+            f"({count / max(elapsed, 1e-6):.0f} строк/с)"
+        ))
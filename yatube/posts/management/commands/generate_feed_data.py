@@ -0,0 +1,131 @@
+import random
+from datetime import timedelta
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from posts import counters, feed, generations, search
+from posts.models import Comment, Follow, Group, Post, User
+
+BATCH_SIZE = 500
+
+
+def zipf_weights(count, exponent):
+    """Накопленные веса распределения Ципфа для random.choices"""
+    return list(accumulate(1 / rank ** exponent
+                           for rank in range(1, count + 1)))
+
+
+class Command(BaseCommand):
+    help = ("Генерирует пользователей, группы, посты, подписки и "
+            "комментарии для нагрузочных замеров лент")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--groups", type=int, default=20)
+        parser.add_argument("--posts", type=int, default=100000)
+        parser.add_argument("--follows", type=int, default=20,
+                            help="Среднее число подписок пользователя")
+        parser.add_argument("--comments", type=int, default=50000)
+        parser.add_argument("--zipf", type=float, default=1.1,
+                            help="Показатель распределения авторов")
+        parser.add_argument("--days", type=int, default=365)
+        parser.add_argument("--seed", type=int, default=None)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        with transaction.atomic():
+            users = self.create_users(options["users"])
+            groups = self.create_groups(options["groups"])
+            weights = zipf_weights(len(users), options["zipf"])
+            posts = self.create_posts(rng, options["posts"], users, groups,
+                                      weights, options["days"])
+            self.create_follows(rng, options["follows"], users, weights)
+            self.create_comments(rng, options["comments"], users, posts,
+                                 options["zipf"])
+            counters.rebuild()
+            feed.rebuild()
+            search.rebuild()
+        generations.bump(generations.GRAPH)
+        self.stdout.write(self.style.SUCCESS(
+            f"Создано: пользователей {len(users)}, групп {len(groups)}, "
+            f"постов {len(posts)}"
+        ))
+
+    def create_users(self, count):
+        start = User.objects.count()
+        password = make_password(None)
+        User.objects.bulk_create(
+            (User(username=f"bench_{start + i}", password=password,
+                  first_name="Автор", last_name=str(start + i))
+             for i in range(count)),
+            batch_size=BATCH_SIZE,
+        )
+        return list(User.objects.filter(
+            username__startswith="bench_"
+        ).order_by("-pk").values_list("pk", flat=True)[:count])
+
+    def create_groups(self, count):
+        start = Group.objects.count()
+        Group.objects.bulk_create(
+            (Group(title=f"Группа {start + i}", slug=f"bench-{start + i}",
+                   description="Сгенерированная группа")
+             for i in range(count)),
+            batch_size=BATCH_SIZE,
+        )
+        return list(Group.objects.filter(
+            slug__startswith="bench-"
+        ).order_by("-pk").values_list("pk", flat=True)[:count])
+
+    def create_posts(self, rng, count, users, groups, weights, days):
+        """Посты авторов по Ципфу, равномерно раскиданные по времени.
+
+        bulk_create проставляет auto_now_add текущим временем, поэтому
+        даты публикации раскладываются вторым проходом bulk_update.
+        """
+        authors = rng.choices(users, cum_weights=weights, k=count)
+        Post.objects.bulk_create(
+            (Post(author_id=author_id,
+                  group_id=rng.choice(groups) if groups else None,
+                  text=f"Сгенерированный пост {i}")
+             for i, author_id in enumerate(authors)),
+            batch_size=BATCH_SIZE,
+        )
+        posts = list(Post.objects.order_by("-pk")[:count])
+        now = timezone.now()
+        for post in posts:
+            post.pub_date = now - timedelta(seconds=rng.uniform(
+                0, days * 24 * 60 * 60))
+        Post.objects.bulk_update(posts, ("pub_date",), batch_size=BATCH_SIZE)
+        return [post.pk for post in posts]
+
+    def create_follows(self, rng, average, users, weights):
+        """Подписки на популярных авторов встречаются чаще"""
+        pairs = set()
+        for user_id in users:
+            count = int(rng.expovariate(1 / average)) if average else 0
+            for author_id in rng.choices(users, cum_weights=weights,
+                                         k=count):
+                if author_id != user_id:
+                    pairs.add((user_id, author_id))
+        Follow.objects.bulk_create(
+            (Follow(user_id=user_id, author_id=author_id)
+             for user_id, author_id in pairs),
+            batch_size=BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+
+    def create_comments(self, rng, count, users, posts, exponent):
+        if not posts:
+            return
+        post_ids = rng.choices(posts, cum_weights=zipf_weights(
+            len(posts), exponent), k=count)
+        Comment.objects.bulk_create(
+            (Comment(post_id=post_id, author_id=rng.choice(users),
+                     text=f"Сгенерированный комментарий {i}")
+             for i, post_id in enumerate(post_ids)),
+            batch_size=BATCH_SIZE,
+        )
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = "Готовит недостающие миниатюры картинок всех постов"
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image="").only(
+            "pk", "image", "author_id", "group_id"
+        )
+        count = 0
+        for post in posts.iterator():
+            thumbnails.schedule(post, inline=True)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(
+            f"Миниатюры проверены у {count} постов"
+        ))
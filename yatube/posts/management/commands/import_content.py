@@ -0,0 +1,42 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = ("Загружает группы, посты, комментарии или подписки из "
+            "JSONL/CSV пачками через bulk_create")
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=transfer.COLUMNS)
+        parser.add_argument("path", help="Файл или - для stdin")
+        parser.add_argument("--format", choices=transfer.FORMATS,
+                            default=None,
+                            help="По умолчанию - по расширению файла")
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        format_ = options["format"] or (
+            transfer.CSV if path.endswith(".csv") else transfer.JSONL
+        )
+        importer = transfer.Importer(options["kind"], options["batch_size"])
+        started = time.perf_counter()
+        if path == "-":
+            loaded, skipped = importer.run(
+                transfer.read_rows(sys.stdin, format_)
+            )
+        else:
+            with open(path, encoding="utf-8", newline="") as file:
+                loaded, skipped = importer.run(
+                    transfer.read_rows(file, format_)
+                )
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Записано строк: {loaded}, пропущено: {skipped} "
+            f"за {elapsed:.1f} с "
+            f"({(loaded + skipped) / max(elapsed, 1e-6):.0f} строк/с)"
+        ))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from posts import counters
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает счетчики авторов и комментариев постов"
+
+    def handle(self, *args, **options):
+        counters.rebuild()
+        self.stdout.write(self.style.SUCCESS("Счетчики пересчитаны"))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = "Строит заново индекс поиска по постам и комментариям"
+
+    def handle(self, *args, **options):
+        search.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f"Индекс поиска ({search.backend()}) перестроен"
+        ))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from posts import feed
+
+
+class Command(BaseCommand):
+    help = ("Перекладывает ленты авторов, ставших популярными "
+            "или переставших ими быть; запускается по расписанию")
+
+    def handle(self, *args, **options):
+        done = feed.relayout()
+        self.stdout.write(self.style.SUCCESS(
+            f"Переложены ленты авторов: {done}"
+        ))
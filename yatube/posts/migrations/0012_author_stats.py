@@ -0,0 +1,65 @@
+# Generated by Django 2.2.16 on 2026-10-18 04:23
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count
+
+
+def fill_stats(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    Follow = apps.get_model('posts', 'Follow')
+    AuthorStats = apps.get_model('posts', 'AuthorStats')
+
+    def grouped(model, field):
+        return dict(model.objects.values_list(field).annotate(
+            total=Count('pk')).order_by())
+
+    posts = grouped(Post, 'author')
+    comments = grouped(Comment, 'author')
+    followers = grouped(Follow, 'author')
+    following = grouped(Follow, 'user')
+    AuthorStats.objects.bulk_create(
+        (AuthorStats(author_id=pk,
+                     posts_count=posts.get(pk, 0),
+                     comments_count=comments.get(pk, 0),
+                     followers_count=followers.get(pk, 0),
+                     following_count=following.get(pk, 0))
+         for pk in User.objects.values_list('pk', flat=True)),
+        batch_size=500,
+    )
+    for post_id, total in grouped(Comment, 'post').items():
+        Post.objects.filter(pk=post_id).update(comments_count=total)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('posts', '0011_feedentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthorStats',
+            fields=[
+                ('author', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Author')),
+                ('posts_count', models.PositiveIntegerField(default=0, verbose_name='Posts count')),
+                ('followers_count', models.PositiveIntegerField(default=0, verbose_name='Followers count')),
+                ('following_count', models.PositiveIntegerField(default=0, verbose_name='Following count')),
+                ('comments_count', models.PositiveIntegerField(default=0, verbose_name='Comments count')),
+            ],
+            options={
+                'verbose_name': 'Author stats',
+                'verbose_name_plural': 'Author stats',
+            },
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Comments count'),
+        ),
+        migrations.RunPython(fill_stats, migrations.RunPython.noop),
+    ]
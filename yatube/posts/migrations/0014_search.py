@@ -0,0 +1,80 @@
+# Generated by Django 2.2.16 on 2026-10-18 04:41
+
+import re
+import unicodedata
+
+from django.db import OperationalError, migrations, models
+import django.db.models.deletion
+
+
+def normalize(text):
+    text = unicodedata.normalize('NFKD', text.casefold())
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return ' '.join(word for word in re.findall(r'\w+', text)
+                    if len(word) <= 64)
+
+
+def create_fts(apps, schema_editor):
+    """Таблица SQLite FTS5 с нормализованными словами постов и комментариев.
+
+    На других базах и без FTS5 поиск использует SearchTerm, который
+    заполняет команда rebuild_search_index.
+    """
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    try:
+        schema_editor.execute(
+            'CREATE VIRTUAL TABLE posts_search USING fts5(text, comments)'
+        )
+    except OperationalError:
+        return
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    comments = {}
+    for post_id, text in Comment.objects.values_list('post_id', 'text'):
+        comments.setdefault(post_id, []).append(text)
+    with schema_editor.connection.cursor() as cursor:
+        cursor.executemany(
+            'INSERT INTO posts_search (rowid, text, comments) '
+            'VALUES (%s, %s, %s)',
+            [(post_id, normalize(text),
+              normalize('\n'.join(comments.get(post_id, ()))))
+             for post_id, text in Post.objects.values_list('pk', 'text')],
+        )
+
+
+def drop_fts(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS posts_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchTerm',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64, verbose_name='Term')),
+                ('weight', models.PositiveIntegerField(verbose_name='Weight')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='posts.Post', verbose_name='Post')),
+            ],
+            options={
+                'verbose_name': 'Search term',
+                'verbose_name_plural': 'Search terms',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='searchterm',
+            index=models.Index(fields=['term', 'post'], name='search_term_post_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='searchterm',
+            constraint=models.UniqueConstraint(fields=('post', 'term'), name='One search term for each post'),
+        ),
+        migrations.RunPython(create_fts, drop_fts),
+    ]
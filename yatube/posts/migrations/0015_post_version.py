@@ -0,0 +1,19 @@
+# Generated by Django 2.2.16 on 2026-10-18 05:12
+
+from django.db import migrations, models
+import posts.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='version',
+            field=models.PositiveIntegerField(default=posts.models.new_version, editable=False, verbose_name='Version'),
+        ),
+    ]
@@ -0,0 +1,92 @@
+# Generated by Django 2.2.16 on 2026-10-18 06:10
+
+import re
+import unicodedata
+
+from django.db import migrations
+
+
+def normalize(text):
+    text = unicodedata.normalize('NFKD', text.casefold())
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return ' '.join(word for word in re.findall(r'\w+', text)
+                    if len(word) <= 64)
+
+
+def _has_fts(schema_editor):
+    connection = schema_editor.connection
+    return (connection.vendor == 'sqlite'
+            and 'posts_search' in connection.introspection.table_names())
+
+
+def _create(schema_editor, columns, *inserts, rank=None):
+    schema_editor.execute('DROP TABLE posts_search')
+    schema_editor.execute(
+        f'CREATE VIRTUAL TABLE posts_search USING fts5({columns})'
+    )
+    if rank:
+        schema_editor.execute(
+            "INSERT INTO posts_search (posts_search, rank) "
+            "VALUES ('rank', %s)", [rank]
+        )
+    with schema_editor.connection.cursor() as cursor:
+        for sql, rows in inserts:
+            cursor.executemany(sql, rows)
+
+
+def comment_rows(apps, schema_editor):
+    """Каждый комментарий — своя строка FTS5 с id поста в колонке post.
+
+    Новый комментарий добавляет одну строку, а не переписывает
+    документ поста со всеми его комментариями. Веса колонок задаются
+    функцией rank таблицы: bm25() нельзя складывать по строкам поста,
+    а скрытую колонку rank — можно.
+    """
+    if not _has_fts(schema_editor):
+        return
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    _create(
+        schema_editor,
+        'text, comments, post UNINDEXED',
+        ('INSERT INTO posts_search (rowid, text, comments, post) '
+         "VALUES (%s, %s, '', %s)",
+         [(post_id, normalize(text), post_id)
+          for post_id, text in Post.objects.values_list('pk', 'text')]),
+        ('INSERT INTO posts_search (rowid, text, comments, post) '
+         "VALUES (%s, '', %s, %s)",
+         [(-comment_id, normalize(text), post_id)
+          for comment_id, post_id, text in Comment.objects.values_list(
+              'pk', 'post_id', 'text')]),
+        rank='bm25(2.0, 1.0)',
+    )
+
+
+def post_documents(apps, schema_editor):
+    if not _has_fts(schema_editor):
+        return
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    comments = {}
+    for post_id, text in Comment.objects.values_list('post_id', 'text'):
+        comments.setdefault(post_id, []).append(text)
+    _create(
+        schema_editor,
+        'text, comments',
+        ('INSERT INTO posts_search (rowid, text, comments) '
+         'VALUES (%s, %s, %s)',
+         [(post_id, normalize(text),
+           normalize('\n'.join(comments.get(post_id, ()))))
+          for post_id, text in Post.objects.values_list('pk', 'text')]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_post_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(comment_rows, post_documents),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 2.2.16 on 2026-10-18 05:33
+
+from django.db import migrations, models
+from django.db.models import Count
+
+from posts.settings import FEED_CELEBRITY_FOLLOWERS
+
+
+def mark_celebrities(apps, schema_editor):
+    """Популярными становятся авторы, уже набравшие порог подписчиков"""
+    AuthorStats = apps.get_model('posts', 'AuthorStats')
+    Follow = apps.get_model('posts', 'Follow')
+    authors = Follow.objects.values('author').annotate(
+        followers=Count('pk')
+    ).filter(
+        followers__gte=FEED_CELEBRITY_FOLLOWERS
+    ).values_list('author', flat=True)
+    for author_id in authors:
+        AuthorStats.objects.update_or_create(
+            author_id=author_id, defaults={'celebrity': True}
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_search_comment_rows'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='authorstats',
+            name='celebrity',
+            field=models.BooleanField(default=False, verbose_name='Celebrity'),
+        ),
+        migrations.RunPython(mark_celebrities, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.16 on 2026-10-18 05:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0017_author_stats_celebrity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='authorstats',
+            name='feed_pending',
+            field=models.BooleanField(default=False, verbose_name='Feed pending'),
+        ),
+    ]
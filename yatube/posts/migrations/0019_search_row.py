@@ -0,0 +1,28 @@
+# Generated by Django 2.2.16 on 2026-10-18 05:46
+
+from django.db import migrations, models
+import posts.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0018_author_stats_feed_pending'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchRow',
+            fields=[
+                ('id', models.IntegerField(db_column='rowid', primary_key=True, serialize=False)),
+                ('text', models.TextField()),
+                ('comments', models.TextField()),
+                ('document', posts.models.SearchDocumentField(db_column='posts_search')),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': 'posts_search',
+                'managed': False,
+            },
+        ),
+    ]
@@ -1,11 +1,22 @@
+import random
+
 from django.contrib.auth import get_user_model
 from django.db import models
-from django.db.models import Q, F
+from django.db.models import Q, F, Lookup
 from django.utils.translation import gettext_lazy as _
 
 User = get_user_model()
 
 
+def new_version():
+    """Версия поста для ключа его карточки в кэше.
+
+    Случайная, а не порядковая: после отката транзакции или
+    пересоздания базы номера повторились бы, а кэш остался прежним.
+    """
+    return random.randrange(1, 2 ** 31)
+
+
 class Group(models.Model):
     """Класс для сообществ"""
 
@@ -42,12 +53,26 @@ class Post(models.Model):
         verbose_name=_("Group"),
     )
     image = models.ImageField(_("Image"), upload_to="posts/", blank=True)
+    comments_count = models.PositiveIntegerField(
+        _("Comments count"), default=0, editable=False
+    )
+    version = models.PositiveIntegerField(
+        _("Version"), default=new_version, editable=False
+    )
 
     class Meta:
         """Указываем необходимую сортировку и название модели"""
         ordering = ("-pub_date",)
         verbose_name = _("Post")
         verbose_name_plural = _("Posts")
+        indexes = (
+            models.Index(fields=("-pub_date", "-id"),
+                         name="post_pub_date_idx"),
+            models.Index(fields=("author", "-pub_date", "-id"),
+                         name="post_author_pub_date_idx"),
+            models.Index(fields=("group", "-pub_date", "-id"),
+                         name="post_group_pub_date_idx"),
+        )
 
     def __str__(self):
         """Выводим текст поста"""
@@ -79,6 +104,10 @@ class Comment(models.Model):
         ordering = ("-created",)
         verbose_name = _("Comment")
         verbose_name_plural = _("Comments")
+        indexes = (
+            models.Index(fields=("post", "-created", "-id"),
+                         name="comment_post_created_idx"),
+        )
 
     def __str__(self):
         return self.text[:30]
@@ -112,3 +141,152 @@ class Follow(models.Model):
                 name='author_and_user_can_not_be_equal'
             )
         )
+        indexes = (
+            models.Index(fields=("author", "user"),
+                         name="follow_author_user_idx"),
+        )
+
+
+class FeedEntry(models.Model):
+    """Запись во входящей ленте подписчика.
+
+    Заполняется при публикации поста для каждого подписчика автора,
+    поэтому страница подписок читается одним диапазоном по индексу.
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="feed_entries",
+        verbose_name=_("User"),
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name="feed_entries",
+        verbose_name=_("Post"),
+    )
+    pub_date = models.DateTimeField(_("Date of publication"))
+
+    class Meta:
+        ordering = ("-pub_date",)
+        verbose_name = _("Feed entry")
+        verbose_name_plural = _("Feed entries")
+        constraints = (
+            models.UniqueConstraint(fields=("user", "post"),
+                                    name="One feed entry for each post"),
+        )
+        indexes = (
+            models.Index(fields=("user", "-pub_date", "-post"),
+                         name="feed_user_pub_date_idx"),
+        )
+
+    def __str__(self):
+        return f"{self.post_id} in feed of {self.user_id}"
+
+
+class AuthorStats(models.Model):
+    """Денормализованные счетчики автора для профиля"""
+
+    author = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="stats",
+        verbose_name=_("Author"),
+    )
+    posts_count = models.PositiveIntegerField(_("Posts count"), default=0)
+    followers_count = models.PositiveIntegerField(_("Followers count"),
+                                                  default=0)
+    following_count = models.PositiveIntegerField(_("Following count"),
+                                                  default=0)
+    comments_count = models.PositiveIntegerField(_("Comments count"),
+                                                 default=0)
+    # Популярный автор: его посты не раскладываются по лентам.
+    celebrity = models.BooleanField(_("Celebrity"), default=False)
+    # Признак сменился, а ленты еще не переложены (feed.relayout):
+    # пока он стоит, посты автора подмешиваются в ленту при чтении.
+    feed_pending = models.BooleanField(_("Feed pending"), default=False)
+
+    class Meta:
+        verbose_name = _("Author stats")
+        verbose_name_plural = _("Author stats")
+
+    def __str__(self):
+        return f"Stats of {self.author_id}"
+
+
+class SearchTerm(models.Model):
+    """Слово поста в переносимом обратном индексе поиска.
+
+    Используется, когда база не поддерживает SQLite FTS5: вес слова -
+    число вхождений в текст поста (с двойным весом) и в комментарии.
+    """
+
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name="search_terms",
+        verbose_name=_("Post"),
+    )
+    term = models.CharField(_("Term"), max_length=64)
+    weight = models.PositiveIntegerField(_("Weight"))
+
+    class Meta:
+        verbose_name = _("Search term")
+        verbose_name_plural = _("Search terms")
+        constraints = (
+            models.UniqueConstraint(fields=("post", "term"),
+                                    name="One search term for each post"),
+        )
+        indexes = (
+            models.Index(fields=("term", "post"),
+                         name="search_term_post_idx"),
+        )
+
+    def __str__(self):
+        return f"{self.term} in {self.post_id}"
+
+
+class Match(Lookup):
+    """Полнотекстовый запрос SQLite FTS5: колонка MATCH запрос"""
+
+    lookup_name = "match"
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f"{lhs} MATCH {rhs}", lhs_params + rhs_params
+
+
+class SearchDocumentField(models.TextField):
+    """Скрытая колонка FTS5 с именем таблицы: поиск по всем колонкам"""
+
+
+SearchDocumentField.register_lookup(Match)
+
+
+class SearchRow(models.Model):
+    """Строка таблицы FTS5 posts_search: текст поста или комментария.
+
+    Таблица создается миграциями вручную, модель лишь дает ORM
+    соединить ее с постами. rowid строки поста - id поста,
+    строки комментария - id комментария со знаком минус.
+    """
+
+    id = models.IntegerField(primary_key=True, db_column="rowid")
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.DO_NOTHING,
+        db_column="post",
+        db_constraint=False,
+        related_name="search_rows",
+    )
+    text = models.TextField()
+    comments = models.TextField()
+    document = SearchDocumentField(db_column="posts_search")
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = "posts_search"
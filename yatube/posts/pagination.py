@@ -0,0 +1,184 @@
+import base64
+import binascii
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.paginator import Page, Paginator
+from django.db.models import Max, Q
+from django.utils.functional import cached_property
+
+FEED_ORDERING = ("-pub_date", "-pk")
+NEXT = "n"
+PREVIOUS = "p"
+
+
+class InvalidCursor(Exception):
+    """Курсор не удалось разобрать"""
+
+
+def encode_cursor(direction, values):
+    """Упаковываем направление и значения ключа в непрозрачную строку"""
+    raw = json.dumps([direction, *values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Распаковываем курсор обратно в направление и значения ключа"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        direction, *values = json.loads(base64.urlsafe_b64decode(padded))
+    except (TypeError, ValueError, binascii.Error):
+        raise InvalidCursor(cursor)
+    if direction not in (NEXT, PREVIOUS):
+        raise InvalidCursor(cursor)
+    return direction, values
+
+
+class KeysetPage(Page):
+    """Страница курсорной пагинации.
+
+    Номера страниц и их общее количество неизвестны, вместо них
+    страница знает курсоры соседних страниц.
+    """
+
+    def __init__(self, object_list, paginator, next_cursor=None,
+                 previous_cursor=None):
+        super().__init__(object_list, 1, paginator)
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return "<Keyset page>"
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+class KeysetPaginator(Paginator):
+    """Пагинатор по ключу (pub_date, id) без COUNT(*) и OFFSET.
+
+    Ключом могут быть и аннотации queryset, например колонки связанной
+    таблицы, по индексу которой читается лента.
+
+    Каждая страница читается одним запросом с условием на ключ
+    последней записи предыдущей страницы, поэтому глубокие страницы
+    стоят столько же, сколько первая.
+    """
+
+    is_keyset = True
+
+    def __init__(self, object_list, per_page, ordering=FEED_ORDERING,
+                 **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.ordering = ordering
+
+    def get_page(self, cursor):
+        """Возвращаем страницу, неверный курсор ведет на первую."""
+        try:
+            direction, values = decode_cursor(cursor)
+            values = self._to_python(values)
+        except InvalidCursor:
+            direction, values = NEXT, None
+        return self.page(direction, values)
+
+    def page(self, direction=NEXT, values=None):
+        backward = direction == PREVIOUS
+        ordering = self.ordering
+        if backward:
+            ordering = tuple(self._flip(field) for field in ordering)
+        queryset = self.object_list.order_by(*ordering)
+        if values:
+            queryset = queryset.filter(self._after(ordering, values))
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backward:
+            rows.reverse()
+        has_next = bool(rows) and (has_more or backward)
+        has_previous = bool(rows) and (has_more if backward else
+                                       bool(values))
+        return KeysetPage(
+            rows,
+            self,
+            next_cursor=(self._cursor(NEXT, rows[-1])
+                         if has_next else None),
+            previous_cursor=(self._cursor(PREVIOUS, rows[0])
+                             if has_previous else None),
+        )
+
+    @staticmethod
+    def _flip(field):
+        return field[1:] if field.startswith("-") else "-" + field
+
+    @staticmethod
+    def _after(ordering, values):
+        """Условие «строго после ключа» для заданного порядка сортировки"""
+        condition = Q()
+        equal = {}
+        for field, value in zip(ordering, values):
+            name = field.lstrip("-")
+            lookup = "lt" if field.startswith("-") else "gt"
+            condition |= Q(**equal, **{f"{name}__{lookup}": value})
+            equal[name] = value
+        return condition
+
+    def _field(self, name):
+        """Поле ключа: поле модели или аннотация queryset"""
+        opts = self.object_list.model._meta
+        if name == "pk":
+            return opts.pk
+        annotation = self.object_list.query.annotations.get(name)
+        if annotation is not None:
+            return annotation.output_field
+        return opts.get_field(name)
+
+    def _to_python(self, values):
+        """Значения ключа из курсора; курсор пишет их непустыми строками"""
+        names = [field.lstrip("-") for field in self.ordering]
+        if len(values) != len(names) or not all(
+            isinstance(value, str) and value for value in values
+        ):
+            raise InvalidCursor(values)
+        try:
+            values = [self._field(name).to_python(value)
+                      for name, value in zip(names, values)]
+        except (FieldDoesNotExist, ValidationError, TypeError, ValueError):
+            raise InvalidCursor(values)
+        if None in values:
+            raise InvalidCursor(values)
+        return values
+
+    def _cursor(self, direction, obj):
+        values = []
+        for field in self.ordering:
+            value = getattr(obj, field.lstrip("-"))
+            values.append(value.isoformat() if hasattr(value, "isoformat")
+                          else str(value))
+        return encode_cursor(direction, values)
+
+
+class EstimatedCountPaginator(Paginator):
+    """Пагинатор с ограниченным подсчетом строк для больших таблиц.
+
+    Точно считается не больше count_limit строк. Если их больше, для
+    выборки без фильтров число оценивается по наибольшему первичному
+    ключу (один шаг по индексу), а для отфильтрованной отдается предел.
+    """
+
+    def __init__(self, object_list, per_page, count_limit=10000, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.count_limit = count_limit
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list.order_by()
+        count = queryset[:self.count_limit + 1].count()
+        if count <= self.count_limit:
+            return count
+        if queryset.query.where:
+            return self.count_limit
+        return max(self.count_limit,
+                   queryset.aggregate(Max("pk"))["pk__max"])
@@ -0,0 +1,274 @@
+import re
+import unicodedata
+from collections import Counter
+from itertools import islice
+
+from django.db import (DEFAULT_DB_ALIAS, connection, connections,
+                       transaction)
+from django.db.models import Count, F, Sum
+
+from . import settings
+from .models import Comment, Post, SearchRow, SearchTerm
+
+FTS5 = "fts5"
+PYTHON = "python"
+FTS_TABLE = "posts_search"
+# Вес совпадения в тексте поста и в его комментариях.
+TEXT_WEIGHT = 2
+COMMENTS_WEIGHT = 1
+TERM_MAX_LENGTH = 64
+
+WORD_RE = re.compile(r"\w+")
+
+
+def tokenize(text):
+    """Слова текста в нижнем регистре и без диакритики.
+
+    В FTS5 пишутся уже нормализованные слова: unicode61 не снимает
+    диакритику с кириллицы (ё, й), а запрос и индекс должны совпадать.
+    """
+    text = unicodedata.normalize("NFKD", text.casefold())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return [word for word in WORD_RE.findall(text)
+            if len(word) <= TERM_MAX_LENGTH]
+
+
+# Есть ли таблица FTS5 в базе: {alias: bool}; сбрасывается после
+# миграций (reset), чтобы процесс увидел созданную или удаленную таблицу.
+_fts5_tables = {}
+
+
+def reset():
+    _fts5_tables.clear()
+
+
+def _fts5_ready(alias):
+    if alias not in _fts5_tables:
+        db = connections[alias]
+        _fts5_tables[alias] = (
+            db.vendor == "sqlite"
+            and FTS_TABLE in db.introspection.table_names()
+        )
+    return _fts5_tables[alias]
+
+
+def backend(alias=DEFAULT_DB_ALIAS):
+    """Индекс поиска в базе alias: SQLite FTS5, если таблица есть,
+    иначе свой"""
+    return settings.SEARCH_BACKEND or (
+        FTS5 if _fts5_ready(alias) else PYTHON
+    )
+
+
+def _weights(text, comments):
+    weights = Counter()
+    for word in tokenize(text):
+        weights[word] += TEXT_WEIGHT
+    for comment in comments:
+        for word in tokenize(comment):
+            weights[word] += COMMENTS_WEIGHT
+    return weights
+
+
+def _fts_posts(posts):
+    """Перезаписываем строки постов в FTS5: {id: текст}"""
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"DELETE FROM {FTS_TABLE} WHERE rowid = %s",
+            [(post_id,) for post_id in posts],
+        )
+        cursor.executemany(
+            f"INSERT INTO {FTS_TABLE} (rowid, text, comments, post) "
+            f"VALUES (%s, %s, '', %s)",
+            [(post_id, " ".join(tokenize(text)), post_id)
+             for post_id, text in posts.items()],
+        )
+
+
+def _fts_comments(comments):
+    """Пишем строки комментариев в FTS5: (id, id поста, текст).
+
+    rowid комментария отрицательный, чтобы не пересекаться с постами.
+    """
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"INSERT INTO {FTS_TABLE} (rowid, text, comments, post) "
+            f"VALUES (%s, '', %s, %s)",
+            [(-comment_id, " ".join(tokenize(text)), post_id)
+             for comment_id, post_id, text in comments],
+        )
+
+
+def _write(documents):
+    """Перезаписываем слова постов: {id: (текст, [комментарии])}"""
+    SearchTerm.objects.filter(post_id__in=documents).delete()
+    SearchTerm.objects.bulk_create(
+        (SearchTerm(post_id=post_id, term=term, weight=weight)
+         for post_id, (text, comments) in documents.items()
+         for term, weight in _weights(text, comments).items()),
+        batch_size=settings.SEARCH_BATCH_SIZE,
+    )
+
+
+def _add_weights(post_id, weights, sign):
+    """Прибавляем (sign=1) или вычитаем (sign=-1) веса слов поста,
+    не перечитывая остальные его комментарии"""
+    terms = SearchTerm.objects.filter(post_id=post_id)
+    by_weight = {}
+    for term, weight in weights.items():
+        by_weight.setdefault(weight, []).append(term)
+    if sign > 0:
+        existing = set(terms.filter(term__in=weights).values_list(
+            "term", flat=True
+        ))
+    for weight, group in by_weight.items():
+        if sign < 0:
+            terms.filter(term__in=group, weight__lte=weight).delete()
+        terms.filter(term__in=group).update(
+            weight=F("weight") + sign * weight
+        )
+    if sign > 0:
+        SearchTerm.objects.bulk_create(
+            SearchTerm(post_id=post_id, term=term, weight=weight)
+            for term, weight in weights.items() if term not in existing
+        )
+
+
+def _documents(post_ids):
+    documents = {
+        post_id: (text, [])
+        for post_id, text in Post.objects.filter(
+            pk__in=post_ids
+        ).values_list("pk", "text")
+    }
+    comments = Comment.objects.filter(post_id__in=documents).values_list(
+        "post_id", "text"
+    )
+    for post_id, text in comments:
+        documents[post_id][1].append(text)
+    return documents
+
+
+@transaction.atomic
+def index_post(post_id):
+    """Переиндексируем текст поста.
+
+    В FTS5 комментарии лежат отдельными строками и не перечитываются.
+    """
+    if backend() == FTS5:
+        text = Post.objects.filter(pk=post_id).values_list(
+            "text", flat=True
+        ).first()
+        if text is None:
+            remove(post_id)
+        else:
+            _fts_posts({post_id: text})
+        return
+    documents = _documents([post_id])
+    if documents:
+        _write(documents)
+    else:
+        remove(post_id)
+
+
+def remove(post_id):
+    """Убираем пост из индекса; строки комментариев FTS5 убирают
+    сигналы удаления самих комментариев"""
+    if backend() == FTS5:
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s",
+                           [post_id])
+    else:
+        SearchTerm.objects.filter(post_id=post_id).delete()
+
+
+@transaction.atomic
+def index_comment(comment):
+    """Добавляем в индекс один комментарий, не трогая остальные"""
+    if backend() == FTS5:
+        _fts_comments([(comment.pk, comment.post_id, comment.text)])
+        return
+    weights = Counter()
+    for word in tokenize(comment.text):
+        weights[word] += COMMENTS_WEIGHT
+    _add_weights(comment.post_id, weights, 1)
+
+
+@transaction.atomic
+def remove_comment(comment):
+    if backend() == FTS5:
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s",
+                           [-comment.pk])
+        return
+    weights = Counter()
+    for word in tokenize(comment.text):
+        weights[word] += COMMENTS_WEIGHT
+    _add_weights(comment.post_id, weights, -1)
+
+
+def _batches(rows):
+    rows = iter(rows)
+    return iter(lambda: list(islice(rows, settings.SEARCH_BATCH_SIZE)), [])
+
+
+@transaction.atomic
+def rebuild():
+    """Строим индекс заново по всем постам, пачками"""
+    reset()
+    if backend() == FTS5:
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        posts = Post.objects.order_by("pk").values_list("pk", "text")
+        for batch in _batches(posts.iterator()):
+            _fts_posts(dict(batch))
+        comments = Comment.objects.order_by("pk").values_list(
+            "pk", "post_id", "text"
+        )
+        for batch in _batches(comments.iterator()):
+            _fts_comments(batch)
+        return
+    SearchTerm.objects.all().delete()
+    post_ids = Post.objects.order_by("pk").values_list("pk", flat=True)
+    for batch in _batches(post_ids.iterator()):
+        _write(_documents(batch))
+
+
+def _search_fts(posts, terms):
+    """Поиск по FTS5: строки поста и его комментариев складываются.
+
+    Строка подходит, если в ней есть хоть одно слово, а пост — если
+    каждое слово нашлось в его тексте или в каком-то комментарии:
+    множество постов с отдельным словом SQLite строит один раз. Ранг —
+    сумма скрытой колонки rank строк: bm25 с весами TEXT_WEIGHT
+    и COMMENTS_WEIGHT, заданными в миграции 0016.
+    """
+    for term in terms if len(terms) > 1 else ():
+        posts = posts.filter(pk__in=SearchRow.objects.filter(
+            document__match=f'"{term}"'
+        ).values("post"))
+    return posts.filter(
+        search_rows__document__match=" OR ".join(f'"{term}"'
+                                                 for term in terms)
+    ).annotate(
+        rank=Sum("search_rows__rank")
+    ).order_by("rank", "-pub_date", "-pk")
+
+
+def search(query, posts=None):
+    """Посты со всеми словами запроса, самые релевантные первыми.
+
+    В posts можно передать уже отфильтрованный queryset, например
+    по группе или автору.
+    """
+    if posts is None:
+        posts = Post.objects.all()
+    terms = list(dict.fromkeys(tokenize(query)))
+    if not terms:
+        return posts.none()
+    if backend(posts.db) == FTS5:
+        return _search_fts(posts, terms)
+    return posts.filter(search_terms__term__in=terms).annotate(
+        rank=Sum("search_terms__weight"),
+        matched=Count("search_terms"),
+    ).filter(matched=len(terms)).order_by("-rank", "-pub_date", "-pk")
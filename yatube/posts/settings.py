@@ -1 +1,58 @@
 POSTS_PER_PAGE = 10
+# Курсорная пагинация лент: при False включается только запросом
+# с параметром ?cursor=, при True используется для всех страниц лент.
+KEYSET_PAGINATION = False
+CURSOR_PARAM = "cursor"
+# Размер пачки при раскладывании постов по лентам подписчиков.
+FEED_BATCH_SIZE = 500
+# Авторы с таким числом подписчиков не раскладываются по лентам,
+# их посты подмешиваются в ленту подписок при чтении.
+FEED_CELEBRITY_FOLLOWERS = 10000
+# Популярный автор снова раскладывается по лентам, только когда
+# подписчиков стало меньше этого числа.
+FEED_CELEBRITY_DEMOTE_FOLLOWERS = 9000
+# Размер пачки при пересчете счетчиков командой rebuild_counters.
+COUNTERS_BATCH_SIZE = 500
+# Срок жизни страниц для анонимов: ключ версионирован поколениями,
+# срок лишь ограничивает хранение осиротевших записей.
+PAGE_CACHE_TIMEOUT = 60 * 60 * 24
+# Срок жизни массивов графа подписок: ограничивает расхождение
+# с базой, если чтение из базы обогнало удаление массива.
+GRAPH_TIMEOUT = 60 * 60
+# Срок жизни карточки поста: ключ версионирован версией поста.
+POST_CARD_TIMEOUT = 60 * 60 * 24
+COMMENTS_PER_PAGE = 20
+COMMENTS_ORDERING = ("-created", "-pk")
+# Миниатюры картинок постов: имя -> (геометрия, опции sorl-thumbnail).
+# Все они готовятся в фоне после сохранения поста.
+POST_THUMBNAILS = {
+    "feed": ("960x339", {"crop": "center", "padding": True,
+                         "upscale": True}),
+    "detail": ("960x339", {"crop": "center", "upscale": True}),
+}
+# Число процессов, готовящих миниатюры; 0 - готовить сразу в потоке
+# запроса (удобно в тестах и командах).
+THUMBNAIL_WORKERS = 2
+# Сколько картинка остается занятой одним процессом сервера, если тот
+# упал, не успев подготовить миниатюры.
+THUMBNAIL_CLAIM_TIMEOUT = 60 * 10
+# Загрузка картинок: больше этого числа пикселей по заголовку файла
+# картинка отклоняется, больше IMAGE_MAX_SIZE - уменьшается.
+# IMAGE_MAX_PIXELS - для JPEG, который декодируется в уменьшенном
+# масштабе; остальные форматы декодируются целиком, и для них
+# (с учетом всех кадров анимации) действует IMAGE_MAX_DECODED_PIXELS.
+IMAGE_MAX_PIXELS = 24_000_000
+IMAGE_MAX_DECODED_PIXELS = 8_000_000
+IMAGE_MAX_SIZE = (1920, 1920)
+IMAGE_JPEG_QUALITY = 85
+# Варианты каждой миниатюры для srcset: ширины (высота пропорциональна)
+# и форматы; последний формат - запасной для <img>.
+POST_THUMBNAIL_WIDTHS = (480, 960)
+POST_THUMBNAIL_FORMATS = ("WEBP", "JPEG")
+POST_THUMBNAIL_SIZES = "(max-width: 960px) 100vw, 960px"
+# Индекс поиска: "fts5", "python" или None - FTS5, если таблица
+# posts_search создана миграцией, иначе переносимый SearchTerm.
+SEARCH_BACKEND = None
+SEARCH_BATCH_SIZE = 500
+# Сколько строк админка считает точно, дальше число оценивается.
+ADMIN_COUNT_LIMIT = 10000
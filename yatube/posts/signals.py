@@ -0,0 +1,181 @@
+from django.db import transaction
+from django.db.models.signals import (post_delete, post_init, post_migrate,
+                                      post_save, pre_delete)
+from django.dispatch import receiver
+
+from . import counters, feed, generations, graph, search, thumbnails
+from .models import Comment, Follow, Group, Post, User, new_version
+
+AUTHOR_NAME_FIELDS = ("username", "first_name", "last_name")
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, **kwargs):
+    """Новый пост попадает в ленты подписчиков автора"""
+    if created:
+        feed.fan_out(instance)
+        counters.change(instance.author_id, posts_count=1)
+
+
+@receiver(post_save, sender=Post)
+def schedule_thumbnails(sender, instance, update_fields=None, **kwargs):
+    """Миниатюры картинки готовятся в фоне после фиксации транзакции"""
+    if instance.image and (update_fields is None
+                           or "image" in update_fields):
+        transaction.on_commit(lambda: thumbnails.schedule(instance))
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    counters.change(instance.author_id, posts_count=-1)
+
+
+@receiver(post_save, sender=Comment)
+def count_comment(sender, instance, created, **kwargs):
+    if created:
+        counters.change_comments(instance.post_id, 1)
+        counters.change(instance.author_id, comments_count=1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    counters.change_comments(instance.post_id, -1)
+    counters.change(instance.author_id, comments_count=-1)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_feed(sender, instance, created, **kwargs):
+    """После подписки в ленте появляются посты автора"""
+    if created:
+        feed.follow(instance.user_id, instance.author_id)
+        graph.forget(instance.user_id, instance.author_id)
+        counters.change(instance.author_id, followers_count=1)
+        counters.change(instance.user_id, following_count=1)
+
+
+@receiver(post_delete, sender=Follow)
+def prune_feed(sender, instance, **kwargs):
+    """После отписки посты автора пропадают из ленты"""
+    feed.unfollow(instance.user_id, instance.author_id)
+    graph.forget(instance.user_id, instance.author_id)
+    counters.change(instance.author_id, followers_count=-1)
+    counters.change(instance.user_id, following_count=-1)
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, created, update_fields=None, **kwargs):
+    if created or update_fields is None or "text" in update_fields:
+        search.index_post(instance.pk)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    search.remove(instance.pk)
+
+
+@receiver(post_save, sender=Comment)
+def index_comment(sender, instance, created, **kwargs):
+    """Комментарии ищутся вместе с постом"""
+    if created:
+        search.index_comment(instance)
+
+
+@receiver(post_delete, sender=Comment)
+def unindex_comment(sender, instance, **kwargs):
+    search.remove_comment(instance)
+
+
+@receiver(post_init, sender=Post)
+def remember_post_group(sender, instance, **kwargs):
+    """Запоминаем группу, чтобы при смене сбросить обе ленты групп"""
+    instance._initial_group_id = instance.__dict__.get("group_id")
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def bump_post_generations(sender, instance, **kwargs):
+    groups = {instance.group_id, instance._initial_group_id} - {None}
+    generations.bump(
+        generations.INDEX,
+        generations.profile(instance.author_id),
+        generations.post(instance.pk),
+        *(generations.group(group_id) for group_id in groups),
+    )
+    instance._initial_group_id = instance.group_id
+
+
+@receiver(post_save, sender=Post)
+def bump_post_version(sender, instance, created, **kwargs):
+    """Правка поста сбрасывает его карточку в лентах"""
+    if not created:
+        instance.version = new_version()
+        Post.objects.filter(pk=instance.pk).update(version=instance.version)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def bump_comment_generations(sender, instance, **kwargs):
+    generations.bump(generations.post(instance.post_id),
+                     generations.stats(instance.author_id))
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def bump_follow_generations(sender, instance, **kwargs):
+    generations.bump(generations.stats(instance.author_id),
+                     generations.stats(instance.user_id))
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def bump_group_generations(sender, instance, created=False, **kwargs):
+    if not created:
+        generations.bump(generations.INDEX, generations.GROUPS,
+                         generations.group(instance.pk))
+
+
+@receiver(post_save, sender=Group)
+@receiver(pre_delete, sender=Group)
+def bump_group_post_versions(sender, instance, created=False, **kwargs):
+    """Ссылка на группу есть в карточке каждого ее поста.
+
+    При удалении версии сдвигаются в той же транзакции, что и
+    обнуление группы у постов.
+    """
+    if not created:
+        instance.posts.update(version=new_version())
+
+
+@receiver(post_init, sender=User)
+def remember_author_name(sender, instance, **kwargs):
+    instance._initial_name = tuple(
+        instance.__dict__.get(field) for field in AUTHOR_NAME_FIELDS
+    )
+
+
+@receiver(post_save, sender=User)
+def bump_author_generations(sender, instance, created, **kwargs):
+    """Имя автора выводится в каждом его посте на всех лентах,
+    а имя и ссылка на профиль — в его комментариях на страницах постов"""
+    name = tuple(getattr(instance, field) for field in AUTHOR_NAME_FIELDS)
+    if not created and name != instance._initial_name:
+        groups = instance.posts.exclude(group=None).values_list(
+            "group_id", flat=True
+        ).distinct()
+        commented = instance.comments.values_list(
+            "post_id", flat=True
+        ).distinct()
+        generations.bump(
+            generations.INDEX,
+            generations.profile(instance.pk),
+            *(generations.group(group_id) for group_id in groups),
+            *(generations.post(post_id) for post_id in commented),
+        )
+        instance.posts.update(version=new_version())
+    instance._initial_name = name
+
+
+@receiver(post_migrate)
+def reset_search_backend(sender, **kwargs):
+    """Миграция могла создать или удалить таблицу FTS5"""
+    search.reset()
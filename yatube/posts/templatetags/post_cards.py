@@ -0,0 +1,18 @@
+from django import template
+
+from .. import cards
+
+register = template.Library()
+
+
+@register.simple_tag
+def prefetch_post_cards(posts):
+    """Заранее достает из кэша карточки всех постов страницы"""
+    cards.prefetch(posts)
+    return ""
+
+
+@register.simple_tag(takes_context=True)
+def post_card(context, post):
+    """Карточка поста для ленты: includes/post.html из кэша"""
+    return cards.render(context, post)
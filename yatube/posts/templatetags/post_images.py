@@ -0,0 +1,11 @@
+from django import template
+
+from .. import thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_picture(post, kind):
+    """Варианты миниатюры, а пока они готовятся - исходная картинка"""
+    return thumbnails.picture(post, kind)
@@ -0,0 +1,66 @@
+from http import HTTPStatus
+
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Comment, Group, Post, User
+from ..pagination import EstimatedCountPaginator
+
+POST_CHANGELIST_URL = reverse("admin:posts_post_changelist")
+COMMENT_CHANGELIST_URL = reverse("admin:posts_comment_changelist")
+
+
+class AdminChangelistTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.admin = User.objects.create_superuser(
+            username="admin", email="admin@example.com", password="pass"
+        )
+        cls.group = Group.objects.create(title="Группа", slug="group",
+                                         description="Описание")
+        cls.posts = Post.objects.bulk_create(
+            Post(author=cls.admin, group=cls.group, text=f"Пост {i}")
+            for i in range(5)
+        )
+        post = Post.objects.create(author=cls.admin, text="Особый пост")
+        Comment.objects.create(post=post, author=cls.admin, text="Коммент")
+        cls.admin_client = Client()
+        cls.admin_client.force_login(cls.admin)
+
+    def test_changelists_query_count_does_not_grow(self):
+        """Списки в админке не делают запросов на каждую строку."""
+        for url in (POST_CHANGELIST_URL, COMMENT_CHANGELIST_URL):
+            with self.subTest(url=url):
+                with self.assertNumQueries(6):
+                    response = self.admin_client.get(url)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertContains(
+            self.admin_client.get(POST_CHANGELIST_URL),
+            f'<option value="{self.group.pk}" selected>{self.group.title}'
+            f'</option>',
+            count=len(self.posts),
+        )
+
+    def test_search_uses_index(self):
+        """Поиск в админке постов идет по индексу поиска."""
+        response = self.admin_client.get(POST_CHANGELIST_URL, {"q": "особый"})
+        self.assertEqual(
+            [post.text for post in response.context["cl"].result_list],
+            ["Особый пост"],
+        )
+
+    def test_estimated_count(self):
+        """Число строк сверх предела оценивается, а не считается."""
+        posts = Post.objects.all()
+        max_pk = posts.order_by("-pk").values_list("pk", flat=True)[0]
+        cases = (
+            (posts, 100, posts.count()),
+            (posts, 2, max_pk),
+            (posts.filter(group=self.group), 2, 2),
+        )
+        for queryset, limit, count in cases:
+            with self.subTest(limit=limit):
+                paginator = EstimatedCountPaginator(queryset, 1,
+                                                    count_limit=limit)
+                self.assertEqual(paginator.count, count)
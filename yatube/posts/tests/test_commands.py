@@ -0,0 +1,154 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase
+
+from .. import thumbnails, transfer
+from ..models import (AuthorStats, Comment, FeedEntry, Follow, Group, Post,
+                      User)
+from ..settings import POST_THUMBNAILS
+from .test_views import SMALL_GIF
+
+
+class FeedDataCommandsTest(TestCase):
+    def test_generate_feed_data(self):
+        """Генератор создает данные, ленты и счетчики."""
+        call_command("generate_feed_data", users=20, groups=3, posts=200,
+                     follows=5, comments=50, seed=1, stdout=StringIO())
+        self.assertEqual(User.objects.count(), 20)
+        self.assertEqual(Post.objects.count(), 200)
+        self.assertEqual(Comment.objects.count(), 50)
+        expected = sum(
+            Post.objects.filter(author_id=author_id).count()
+            for author_id in Follow.objects.values_list("author",
+                                                        flat=True)
+        )
+        self.assertEqual(FeedEntry.objects.count(), expected)
+        self.assertEqual(
+            sum(AuthorStats.objects.values_list("posts_count", flat=True)),
+            200,
+        )
+
+    def test_benchmark_feeds_writes_report(self):
+        """Замер сохраняет метрики каждой ленты в JSON."""
+        call_command("generate_feed_data", users=10, groups=2, posts=30,
+                     follows=3, comments=10, seed=2, stdout=StringIO())
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, "report.json")
+            call_command("benchmark_feeds", requests=2, output=output,
+                         stdout=StringIO())
+            with open(output) as report_file:
+                report = json.load(report_file)
+        self.assertIn("index", report)
+        for metrics in report.values():
+            self.assertEqual(
+                set(metrics), {"url", "p50_ms", "p99_ms", "queries", "bytes"}
+            )
+
+    def test_generate_thumbnails(self):
+        """Команда готовит все варианты миниатюр постов с картинками."""
+        author = User.objects.create_user(username="thumbs")
+        post = Post.objects.create(
+            author=author, text="Пост", image=SimpleUploadedFile(
+                name="command.gif", content=SMALL_GIF,
+                content_type="image/gif"
+            )
+        )
+        call_command("generate_thumbnails", stdout=StringIO())
+        for kind in POST_THUMBNAILS:
+            with self.subTest(kind=kind):
+                self.assertTrue(thumbnails.picture(post, kind).ready)
+
+    def test_export_import_round_trip(self):
+        """Выгрузка и загрузка восстанавливают данные и производные."""
+        call_command("generate_feed_data", users=10, groups=2, posts=40,
+                     follows=3, comments=20, seed=3, stdout=StringIO())
+        kinds = ("groups", "posts", "comments", "follows")
+        snapshot = {
+            "posts": sorted(Post.objects.values_list(
+                "pk", "author__username", "group__slug", "text", "pub_date"
+            )),
+            "comments": sorted(Comment.objects.values_list(
+                "pk", "post", "author__username", "text", "created"
+            )),
+            "follows": sorted(Follow.objects.values_list(
+                "user__username", "author__username"
+            )),
+            "feed": FeedEntry.objects.count(),
+        }
+        for extension in ("jsonl", "csv"):
+            with self.subTest(extension=extension), \
+                    tempfile.TemporaryDirectory() as directory:
+                paths = {kind: os.path.join(directory, f"{kind}.{extension}")
+                         for kind in kinds}
+                for kind in kinds:
+                    call_command("export_content", kind, paths[kind],
+                                 stdout=StringIO())
+                for model in (Follow, Comment, Post, Group):
+                    model.objects.all().delete()
+                for kind in kinds:
+                    call_command("import_content", kind, paths[kind],
+                                 stdout=StringIO())
+                self.assertEqual(snapshot, {
+                    "posts": sorted(Post.objects.values_list(
+                        "pk", "author__username", "group__slug", "text",
+                        "pub_date"
+                    )),
+                    "comments": sorted(Comment.objects.values_list(
+                        "pk", "post", "author__username", "text", "created"
+                    )),
+                    "follows": sorted(Follow.objects.values_list(
+                        "user__username", "author__username"
+                    )),
+                    "feed": FeedEntry.objects.count(),
+                })
+
+    def test_import_skips_taken_keys(self):
+        """Строки с занятым id или повтором пропускаются и не считаются."""
+        user = User.objects.create_user(username="auth")
+        author = User.objects.create_user(username="author")
+        post = Post.objects.create(author=user, text="Старый пост")
+        Follow.objects.create(user=user, author=author)
+        rows = [
+            {"id": str(post.pk), "author": "auth", "text": "Чужой пост"},
+            {"id": str(post.pk + 1), "author": "auth", "text": "Новый"},
+            {"id": str(post.pk + 1), "author": "auth", "text": "Повтор"},
+        ]
+        self.assertEqual(transfer.Importer("posts", 2).run(rows), (1, 2))
+        self.assertEqual(Post.objects.get(pk=post.pk).text, "Старый пост")
+        self.assertEqual(Post.objects.get(pk=post.pk + 1).text, "Новый")
+        comments = [{"id": "", "post": str(post.pk), "author": "auth",
+                     "text": "Комментарий"}] * 2
+        self.assertEqual(transfer.Importer("comments", 10).run(comments),
+                         (2, 0))
+        follows = [{"user": "auth", "author": "author"},
+                   {"user": "author", "author": "auth"},
+                   {"user": "author", "author": "auth"}]
+        self.assertEqual(transfer.Importer("follows", 10).run(follows),
+                         (1, 2))
+        self.assertEqual(Follow.objects.count(), 2)
+
+    def test_import_skips_unparseable_references(self):
+        """Строки с пустой или нечисловой ссылкой пропускаются, а уже
+        записанные пачки пересчитываются даже при обрыве загрузки."""
+        user = User.objects.create_user(username="auth")
+        post = Post.objects.create(author=user, text="Пост")
+        rows = [{"id": "", "post": value, "author": "auth",
+                 "text": "Комментарий"} for value in ("", "x", str(post.pk))]
+        rows.append({"id": "y", "post": str(post.pk), "author": "auth",
+                     "text": "Комментарий"})
+        self.assertEqual(transfer.Importer("comments", 2).run(rows), (1, 3))
+        self.assertEqual(post.comments.count(), 1)
+
+        def broken():
+            yield {"id": "", "author": "auth", "text": "Записанный пост"}
+            raise OSError("Файл оборвался")
+
+        with self.assertRaises(OSError):
+            transfer.Importer("posts", 1).run(broken())
+        self.assertEqual(AuthorStats.objects.get(author=user).posts_count,
+                         2)
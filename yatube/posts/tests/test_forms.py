@@ -1,8 +1,13 @@
+from io import BytesIO
+from unittest import mock
+
 from django.test import Client, TestCase
 from django.urls import reverse
 from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image
 
 from ..forms import CommentForm
+from ..settings import IMAGE_MAX_SIZE
 from ..models import Post, Group, User, Comment
 
 COMMENT_TEXT = "Тестовый комментарий"
@@ -155,6 +160,100 @@ class FormsTests(TestCase):
         self.assertRedirects(response, self.POST_DETAIL_URL)
 
 
+class ImageUploadFormTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=USERNAME)
+        cls.authorized_client = Client()
+        cls.authorized_client.force_login(cls.user)
+
+    @staticmethod
+    def photo(size):
+        exif = Image.Exif()
+        exif[0x010F] = "Camera"
+        file = BytesIO()
+        Image.new("RGB", size, "red").save(file, "JPEG", exif=exif)
+        return SimpleUploadedFile(name="photo.jpeg", content=file.getvalue(),
+                                  content_type="image/jpeg")
+
+    def test_large_image_downscaled_without_metadata(self):
+        """Большая картинка уменьшается и теряет метаданные."""
+        width, height = IMAGE_MAX_SIZE
+        self.authorized_client.post(POST_CREATE_URL, data={
+            "text": POST_TEXT,
+            "image": self.photo((width * 2, height)),
+        })
+        post = Post.objects.get()
+        self.assertTrue(post.image.name.endswith(".jpg"))
+        with Image.open(post.image) as image:
+            self.assertEqual(image.size, (width, height // 2))
+            self.assertEqual(image.format, "JPEG")
+            self.assertNotIn("exif", image.info)
+
+    def test_too_many_pixels_rejected(self):
+        """Картинка с огромными размерами в заголовке отклоняется."""
+        with mock.patch("posts.settings.IMAGE_MAX_PIXELS", 100):
+            response = self.authorized_client.post(POST_CREATE_URL, data={
+                "text": POST_TEXT,
+                "image": self.photo((20, 10)),
+            })
+        self.assertFormError(response, "form", "image",
+                             "Картинка слишком большая: 20×10 пикселей")
+        self.assertFalse(Post.objects.exists())
+
+    def test_truncated_image_rejected(self):
+        """Обрезанный файл отклоняется формой, а не падает в 500."""
+        width, height = IMAGE_MAX_SIZE
+        photo = self.photo((width * 2, height))
+        content = photo.read()
+        response = self.authorized_client.post(POST_CREATE_URL, data={
+            "text": POST_TEXT,
+            "image": SimpleUploadedFile(
+                name="photo.jpeg", content=content[:len(content) // 2],
+                content_type="image/jpeg"),
+        })
+        self.assertFormError(response, "form", "image",
+                             "Не удалось прочитать картинку: файл поврежден")
+        self.assertFalse(Post.objects.exists())
+
+    def test_animation_downscaled_without_metadata(self):
+        """Анимация уменьшается покадрово и теряет метаданные."""
+        width, height = IMAGE_MAX_SIZE
+        frames = [Image.new("RGB", (width * 2, 20), color)
+                  for color in ("red", "blue")]
+        file = BytesIO()
+        frames[0].save(file, "GIF", save_all=True, append_images=frames[1:],
+                       duration=100, loop=0, comment=b"secret")
+        self.authorized_client.post(POST_CREATE_URL, data={
+            "text": POST_TEXT,
+            "image": SimpleUploadedFile(name="anim.gif",
+                                        content=file.getvalue(),
+                                        content_type="image/gif"),
+        })
+        post = Post.objects.get()
+        with Image.open(post.image) as image:
+            self.assertEqual(image.format, "GIF")
+            self.assertEqual(image.size, (width, 10))
+            self.assertEqual(image.n_frames, 2)
+            self.assertNotIn("comment", image.info)
+
+    def test_decoded_pixels_limited_for_png(self):
+        """PNG декодируется целиком, для него действует меньший предел."""
+        file = BytesIO()
+        Image.new("RGB", (20, 10), "red").save(file, "PNG")
+        with mock.patch("posts.settings.IMAGE_MAX_DECODED_PIXELS", 100):
+            response = self.authorized_client.post(POST_CREATE_URL, data={
+                "text": POST_TEXT,
+                "image": SimpleUploadedFile(name="photo.png",
+                                            content=file.getvalue(),
+                                            content_type="image/png"),
+            })
+        self.assertFormError(response, "form", "image",
+                             "Картинка слишком большая: 20×10 пикселей")
+        self.assertFalse(Post.objects.exists())
+
+
 class CommentCreateFormTests(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -0,0 +1,96 @@
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase
+
+from .. import generations, graph
+from ..models import Follow, Post, User
+
+
+class FollowGraphTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader, cls.author, cls.other = (
+            User.objects.create_user(username=name)
+            for name in ("reader", "author", "other")
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        Follow.objects.create(user=cls.other, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_lookups(self):
+        """Массивы подписок и подписчиков отсортированы."""
+        self.assertEqual(list(graph.followers(self.author)),
+                         sorted([self.reader.pk, self.other.pk]))
+        self.assertEqual(list(graph.followees(self.reader)), [self.author.pk])
+        self.assertEqual(list(graph.followees(self.author)), [])
+        self.assertEqual(
+            graph.is_following_many(self.reader, [self.author, self.other]),
+            {self.author.pk: True, self.other.pk: False},
+        )
+        self.assertFalse(graph.is_following(AnonymousUser(), self.author))
+
+    def test_cached_lookups_need_no_sql(self):
+        """Повторные проверки подписки не обращаются к базе."""
+        with self.assertNumQueries(1):
+            graph.followees_many([self.reader, self.other])
+        with self.assertNumQueries(0):
+            self.assertTrue(graph.is_following(self.other, self.author))
+            graph.followees(self.reader)
+
+    def test_bulk_changes_reload_graph(self):
+        """Сдвиг поколения графа перечитывает массивы из базы."""
+        graph.followees(self.author)
+        Follow.objects.bulk_create([Follow(user=self.author,
+                                           author=self.other)])
+        self.assertFalse(graph.is_following(self.author, self.other))
+        generations.bump(generations.GRAPH)
+        self.assertTrue(graph.is_following(self.author, self.other))
+
+    def test_page_authors(self):
+        """Подписки на авторов страницы одним обращением к графу."""
+        posts = [Post(author=author, text="Пост")
+                 for author in (self.author, self.other, self.author,
+                                self.reader)]
+        graph.followees(self.reader)
+        with self.assertNumQueries(0):
+            self.assertEqual(graph.page_authors(self.reader, posts),
+                             [(self.author, True), (self.other, False)])
+            self.assertEqual(graph.page_authors(AnonymousUser(), posts), [])
+
+
+class FollowGraphCommitTest(TransactionTestCase):
+    """Сигналы Follow сбрасывают массивы только после фиксации"""
+
+    def setUp(self):
+        cache.clear()
+        self.reader, self.author = (
+            User.objects.create_user(username=name)
+            for name in ("reader", "author")
+        )
+
+    def test_commit_drops_cached_arrays(self):
+        """Подписка и отписка удаляют массивы, чтение берет их из базы."""
+        graph.followees(self.reader)
+        graph.followers(self.author)
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        with self.assertNumQueries(2):
+            self.assertTrue(graph.is_following(self.reader, self.author))
+            self.assertEqual(list(graph.followers(self.author)),
+                             [self.reader.pk])
+        follow.delete()
+        with self.assertNumQueries(2):
+            self.assertFalse(graph.is_following(self.reader, self.author))
+            self.assertEqual(list(graph.followers(self.author)), [])
+
+    def test_rollback_keeps_cached_arrays(self):
+        """Откаченная подписка не попадает в кэш."""
+        graph.followees(self.reader)
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            Follow.objects.create(user=self.reader, author=self.author)
+            raise RuntimeError
+        with self.assertNumQueries(0):
+            self.assertFalse(graph.is_following(self.reader, self.author))
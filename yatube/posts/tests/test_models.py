@@ -1,7 +1,10 @@
+from io import StringIO
+
+from django.core.management import call_command
 from django.db import IntegrityError
 from django.test import TestCase, override_settings
 
-from ..models import Group, Post, User, Comment, Follow
+from ..models import AuthorStats, Group, Post, User, Comment, Follow
 
 
 @override_settings(LANGUAGE_CODE='en-US', LANGUAGES=(('en', 'English'),))
@@ -152,3 +155,51 @@ class FollowModelTest(TestCase):
                 author=self.user_author,
                 user=self.user_author,
             )
+
+
+class AuthorStatsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username="author")
+        cls.reader = User.objects.create_user(username="reader")
+
+    def assertStats(self, user, **expected):
+        stats = AuthorStats.objects.get(author=user)
+        for field, value in expected.items():
+            with self.subTest(field=field):
+                self.assertEqual(getattr(stats, field), value)
+
+    def test_counters_follow_creation_and_deletion(self):
+        """Счетчики меняются при создании и удалении объектов."""
+        post = Post.objects.create(author=self.author, text="Пост")
+        comment = Comment.objects.create(post=post, author=self.reader,
+                                         text="Коммент")
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertStats(self.author, posts_count=1, followers_count=1)
+        self.assertStats(self.reader, comments_count=1, following_count=1)
+
+        comment.delete()
+        follow.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        self.assertStats(self.author, posts_count=1, followers_count=0)
+        self.assertStats(self.reader, comments_count=0, following_count=0)
+
+    def test_rebuild_counters_command(self):
+        """Команда rebuild_counters учитывает записи без сигналов."""
+        Post.objects.bulk_create(
+            Post(author=self.author, text=f"Пост {i}") for i in range(3)
+        )
+        post = Post.objects.first()
+        Comment.objects.bulk_create(
+            Comment(post=post, author=self.reader, text="Коммент")
+            for _ in range(2)
+        )
+        call_command("rebuild_counters", stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 2)
+        self.assertStats(self.author, posts_count=3, comments_count=0)
+        self.assertStats(self.reader, posts_count=0, comments_count=2)
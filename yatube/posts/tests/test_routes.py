@@ -11,7 +11,9 @@ ROUTES = (
     ("index", "/", []),
     ("post_edit", f"/posts/{ID}/edit/", [ID]),
     ("post_create", "/create/", []),
+    ("search", "/search/", []),
     ("post_detail", f"/posts/{ID}/", [ID]),
+    ("post_comments", f"/posts/{ID}/comments/", [ID]),
     ("profile", f"/profile/{USERNAME}/", [USERNAME]),
     ("add_comment", f"/posts/{ID}/comment/", [ID]),
     ("group_list", f"/group/{SLUG}/", [SLUG]),
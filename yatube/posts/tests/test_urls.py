@@ -10,6 +10,7 @@ CREATE_URL = reverse("posts:post_create")
 LOGIN_URL = reverse("users:login")
 NEXT = "?next="
 FOLLOW_INDEX_URL = reverse("posts:follow_index")
+SEARCH_URL = reverse("posts:search")
 GROUP_SLUG = "test-slug"
 GROUP_SLUG_URL = reverse("posts:group_list", args=[GROUP_SLUG])
 GROUP_WRONG_SLUG_URL = reverse("posts:group_list", args=["wrong"])
@@ -60,6 +61,7 @@ class PostURLTests(TestCase):
             (POST_EDIT_WRONG_URL, self.authorized_client,
              HTTPStatus.NOT_FOUND),
             (FOLLOW_INDEX_URL, self.authorized_client, HTTPStatus.OK),
+            (SEARCH_URL, self.client, HTTPStatus.OK),
             ("/nonexistent_page/", self.client, HTTPStatus.NOT_FOUND),
 
             (CREATE_URL, self.client, HTTPStatus.FOUND),
@@ -110,6 +112,7 @@ class PostURLTests(TestCase):
             CREATE_URL: 'posts/post_create.html',
             self.POST_EDIT_URL: 'posts/post_create.html',
             FOLLOW_INDEX_URL: 'posts/follow.html',
+            SEARCH_URL: 'posts/search.html',
         }
         for address, template in templates_url_names.items():
             with self.subTest(template=template):
@@ -1,10 +1,21 @@
+from concurrent.futures import Future
+from http import HTTPStatus
+from io import StringIO
+from unittest import mock
+
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, connection
 from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
-from ..models import Group, Post, User, Follow
-from ..settings import POSTS_PER_PAGE
+from .. import cards, feed, search, thumbnails
+from ..models import (AuthorStats, Comment, FeedEntry, Group, Post, User,
+                      Follow)
+from ..pagination import NEXT, encode_cursor
+from ..settings import COMMENTS_PER_PAGE, POSTS_PER_PAGE
 
 SMALL_GIF = (
     b"\x47\x49\x46\x38\x39\x61\x02\x00"
@@ -24,6 +35,7 @@ PROFILE_URL = reverse("posts:profile", kwargs={"username": USERNAME})
 GROUP_URL = reverse("posts:group_list", kwargs={"slug": GROUP_SLUG})
 GROUP2_URL = reverse("posts:group_list", kwargs={"slug": GROUP2_SLUG})
 FOLLOW_INDEX_URL = reverse("posts:follow_index")
+SEARCH_URL = reverse("posts:search")
 POST_CREATE_URL = reverse("posts:post_create")
 POSTS_PER_PAGE2 = 1
 FOLLOW_SECOND_USER_URL = reverse(
@@ -108,15 +120,37 @@ class PostViewTests(TestCase):
     def test_cache(self):
         """Тест по кэшу index"""
         post_cache = self.authorized_client.post(INDEX_URL)
-        post_1 = Post.objects.get(id=self.post.id)
-        post_1.text = "Текст для кэша"
-        post_1.save()
+        Post.objects.filter(id=self.post.id).update(text="Текст для кэша")
         post_cache_2 = self.authorized_client.get(INDEX_URL)
         self.assertEqual(post_cache.content, post_cache_2.content)
         cache.clear()
         post_cache_3 = self.authorized_client.get(INDEX_URL)
         self.assertNotEqual(post_cache.content, post_cache_3.content)
 
+    def test_cache_invalidated_by_post_changes(self):
+        """Правка поста сбрасывает фрагменты всех его лент."""
+        pages = (INDEX_URL, GROUP2_URL, PROFILE_URL)
+        before = [self.authorized_client.get(url).content for url in pages]
+        post = Post.objects.get(id=self.post.id)
+        post.text = "Новый текст"
+        post.group = self.group2
+        post.save()
+        for url, content in zip(pages, before):
+            with self.subTest(url=url):
+                self.assertNotEqual(
+                    self.authorized_client.get(url).content, content
+                )
+
+    def test_cache_invalidated_by_author_name(self):
+        """Смена имени автора сбрасывает фрагменты с его постами."""
+        before = self.authorized_client.get(INDEX_URL).content
+        user = User.objects.get(pk=self.user.pk)
+        user.first_name = "Лев"
+        user.save()
+        self.assertNotEqual(
+            self.authorized_client.get(INDEX_URL).content, before
+        )
+
     def test_author_in_profile_context(self):
         """Шаблон profile сформирован с правильным контекстом."""
         self.assertEqual(self.user, self.authorized_client.get(PROFILE_URL).
@@ -211,3 +245,717 @@ class FollowViewsTest(TestCase):
                 author=self.second_user, user=self.first_user
             ).exists()
         )
+
+    def test_feed_filled_on_follow_and_post(self):
+        """Посты автора попадают в ленту при подписке и публикации."""
+        self.authorized_client_1.get(FOLLOW_SECOND_USER_URL)
+        new_post = Post.objects.create(text="Новый пост",
+                                       author=self.second_user)
+        self.assertEqual(
+            set(FeedEntry.objects.filter(user=self.first_user)
+                .values_list("post", flat=True)),
+            {self.post.pk, new_post.pk},
+        )
+        response = self.authorized_client_1.get(FOLLOW_INDEX_URL)
+        self.assertEqual(list(response.context["page_obj"]),
+                         [new_post, self.post])
+
+    def test_feed_pruned_on_unfollow(self):
+        """После отписки лента подписчика очищается от постов автора."""
+        Follow.objects.create(author=self.second_user, user=self.first_user)
+        self.authorized_client_1.get(UNFOLLOW_SECOND_USER_URL)
+        self.assertFalse(
+            FeedEntry.objects.filter(user=self.first_user).exists()
+        )
+
+
+class HybridFeedViewsTest(TestCase):
+    """Посты популярных авторов подмешиваются в ленту при чтении"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username=USERNAME)
+        cls.fan = User.objects.create_user(username=USERNAME2)
+        cls.star = User.objects.create_user(username="star")
+        cls.author = User.objects.create_user(username="author")
+        cls.authorized_client = Client()
+        cls.authorized_client.force_login(cls.reader)
+
+    def setUp(self):
+        patcher = mock.patch("posts.feed.FEED_CELEBRITY_FOLLOWERS", 2)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=self.reader, author=self.star)
+        Follow.objects.create(user=self.fan, author=self.star)
+        self.posts = [
+            Post.objects.create(text=f"Пост {i}", author=author)
+            for i, author in enumerate(
+                (self.author, self.star, self.author, self.star)
+            )
+        ]
+
+    def test_celebrity_posts_not_fanned_out(self):
+        """Посты популярного автора не пишутся в ленты подписчиков."""
+        self.assertFalse(
+            FeedEntry.objects.filter(post__author=self.star).exists()
+        )
+        self.assertEqual(
+            FeedEntry.objects.filter(user=self.reader).count(), 2
+        )
+
+    def test_follow_feed_merges_celebrity_posts(self):
+        """Лента подписок содержит посты всех авторов по дате."""
+        response = self.authorized_client.get(FOLLOW_INDEX_URL)
+        self.assertEqual(list(response.context["page_obj"]),
+                         self.posts[::-1])
+
+    def test_author_below_threshold_fanned_out_again(self):
+        """После отписки автор снова раскладывается по лентам вне запроса."""
+        with CaptureQueriesContext(connection) as queries:
+            Follow.objects.get(user=self.fan, author=self.star).delete()
+        self.assertFalse([
+            query for query in queries
+            if query["sql"].startswith("INSERT")
+            and "posts_feedentry" in query["sql"]
+        ])
+        self.assertFalse(feed.is_celebrity(self.star.pk))
+        response = self.authorized_client.get(FOLLOW_INDEX_URL)
+        self.assertEqual(list(response.context["page_obj"]),
+                         self.posts[::-1])
+        self.assertEqual(response.context["page_obj"].paginator.count, 4)
+        call_command("relayout_feeds", stdout=StringIO())
+        self.assertEqual(
+            FeedEntry.objects.filter(user=self.reader).count(), 4
+        )
+        self.assertFalse(AuthorStats.objects.filter(
+            feed_pending=True).exists())
+
+    def test_new_celebrity_entries_dropped_outside_request(self):
+        """Новый популярный автор убирается из лент вне запроса."""
+        Post.objects.filter(author=self.star).delete()
+        with mock.patch("posts.feed.FEED_CELEBRITY_FOLLOWERS", 3):
+            stranger = User.objects.create_user(username="stranger")
+            Follow.objects.create(user=stranger, author=self.author)
+            with CaptureQueriesContext(connection) as queries:
+                Follow.objects.create(user=self.fan, author=self.author)
+        self.assertFalse([
+            query for query in queries
+            if query["sql"].startswith("DELETE")
+            and "posts_feedentry" in query["sql"]
+        ])
+        self.assertTrue(feed.is_celebrity(self.author.pk))
+        response = self.authorized_client.get(FOLLOW_INDEX_URL)
+        self.assertEqual(list(response.context["page_obj"]),
+                         [self.posts[2], self.posts[0]])
+        self.assertEqual(response.context["page_obj"].paginator.count, 2)
+        call_command("relayout_feeds", stdout=StringIO())
+        self.assertFalse(
+            FeedEntry.objects.filter(post__author=self.author).exists()
+        )
+
+    def test_celebrity_kept_inside_band(self):
+        """Отписка и подписка у порога не перекладывают ленты."""
+        with mock.patch("posts.feed.FEED_CELEBRITY_DEMOTE_FOLLOWERS", 1):
+            Follow.objects.get(user=self.fan, author=self.star).delete()
+            self.assertTrue(feed.is_celebrity(self.star.pk))
+            Follow.objects.create(user=self.fan, author=self.star)
+        self.assertTrue(feed.is_celebrity(self.star.pk))
+        self.assertFalse(
+            FeedEntry.objects.filter(post__author=self.star).exists()
+        )
+        response = self.authorized_client.get(FOLLOW_INDEX_URL)
+        self.assertEqual(list(response.context["page_obj"]),
+                         self.posts[::-1])
+
+
+class KeysetPaginatorViewsTest(TestCase):
+    """Проверяем курсорную пагинацию лент"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=USERNAME)
+        cls.group = Group.objects.create(
+            title="Тестовая группа",
+            slug=GROUP_SLUG,
+            description="Тестовое описание",
+        )
+        Post.objects.bulk_create(
+            Post(author=cls.user, group=cls.group, text=f"Текст {i}")
+            for i in range(POSTS_PER_PAGE + POSTS_PER_PAGE2)
+        )
+        cls.reader = User.objects.create_user(username=USERNAME2)
+        Follow.objects.create(user=cls.reader, author=cls.user)
+        cls.authorized_client = Client()
+        cls.authorized_client.force_login(cls.user)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cursor_pages_walk_whole_feed(self):
+        """Курсоры ведут по ленте вперед и назад без пропусков."""
+        for url in (INDEX_URL, GROUP_URL, PROFILE_URL):
+            with self.subTest(url=url):
+                first = self.client.get(url + "?cursor=").context["page_obj"]
+                self.assertEqual(len(first), POSTS_PER_PAGE)
+                self.assertFalse(first.has_previous())
+                second = self.client.get(
+                    url + "?cursor=" + first.next_cursor
+                ).context["page_obj"]
+                self.assertEqual(len(second), POSTS_PER_PAGE2)
+                self.assertFalse(second.has_next())
+                self.assertEqual(
+                    list(first) + list(second),
+                    list(Post.objects.order_by("-pub_date", "-pk")),
+                )
+                back = self.client.get(
+                    url + "?cursor=" + second.previous_cursor
+                ).context["page_obj"]
+                self.assertEqual(list(back), list(first))
+
+    def test_follow_feed_cursor_reads_inbox_index(self):
+        """Курсорные страницы подписок идут по индексу ленты без сортировки."""
+        client = Client()
+        client.force_login(self.reader)
+        first = client.get(
+            FOLLOW_INDEX_URL + "?cursor="
+        ).context["page_obj"]
+        with CaptureQueriesContext(connection) as queries:
+            second = client.get(
+                FOLLOW_INDEX_URL + "?cursor=" + first.next_cursor
+            ).context["page_obj"]
+        self.assertEqual(list(first) + list(second),
+                         list(Post.objects.order_by("-pub_date", "-pk")))
+        sql = next(query["sql"] for query in queries
+                   if "posts_feedentry" in query["sql"])
+        with connection.cursor() as cursor:
+            cursor.execute("EXPLAIN QUERY PLAN " + sql)
+            plan = " ".join(str(row) for row in cursor.fetchall())
+        self.assertIn("feed_user_pub_date_idx", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_invalid_cursor_shows_first_page(self):
+        """Неверный курсор открывает первую страницу."""
+        post = Post.objects.first()
+        comments_url = reverse("posts:post_comments",
+                               kwargs={"post_id": post.pk})
+        detail_url = reverse("posts:post_detail",
+                             kwargs={"post_id": post.pk})
+        cursors = (
+            "garbage",
+            encode_cursor(NEXT, [[1], 1]),
+            encode_cursor(NEXT, [None, None]),
+            encode_cursor(NEXT, ["", ""]),
+            encode_cursor(NEXT, [{"a": 1}, "1"]),
+            encode_cursor(NEXT, ["2021-01-01T00:00:00", "x"]),
+        )
+        for cursor in cursors:
+            with self.subTest(cursor=cursor):
+                response = self.client.get(INDEX_URL, {"cursor": cursor})
+                self.assertEqual(len(response.context["page_obj"]),
+                                 POSTS_PER_PAGE)
+                for url in (detail_url, comments_url):
+                    response = self.client.get(url, {"cursor": cursor})
+                    self.assertEqual(response.status_code, HTTPStatus.OK)
+
+
+class AnonymousPageCacheTest(TestCase):
+    """Проверяем кэш страниц для анонимных посетителей"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=USERNAME)
+        cls.post = Post.objects.create(author=cls.user, text="Тестовый пост")
+        cls.authorized_client = Client()
+        cls.authorized_client.force_login(cls.user)
+        cls.POST_DETAIL_URL = reverse(
+            "posts:post_detail", kwargs={"post_id": cls.post.pk}
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_anonymous_pages_served_from_cache(self):
+        """Повторный запрос анонима не выполняет view."""
+        for url in (INDEX_URL, PROFILE_URL, self.POST_DETAIL_URL):
+            with self.subTest(url=url):
+                first = self.client.get(url)
+                second = self.client.get(url)
+                self.assertIsNotNone(first.context)
+                self.assertIsNone(second.context)
+                self.assertEqual(first.content, second.content)
+                self.assertEqual(first["ETag"], second["ETag"])
+
+    def test_unrelated_params_reuse_cached_page(self):
+        """Посторонние параметры запроса не создают новых записей кэша."""
+        self.client.get(INDEX_URL, {"page": 1})
+        response = self.client.get(
+            INDEX_URL, {"utm_source": "mail", "x": 1, "page": 1}
+        )
+        self.assertIsNone(response.context)
+        other_page = self.client.get(INDEX_URL, {"page": 2, "x": 1})
+        self.assertIsNotNone(other_page.context)
+
+    def test_conditional_request_not_modified(self):
+        """Совпавший ETag дает ответ 304."""
+        etag = self.client.get(INDEX_URL)["ETag"]
+        response = self.client.get(INDEX_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_authenticated_bypass_cache(self):
+        """Авторизованный пользователь всегда получает свежую страницу."""
+        self.client.get(INDEX_URL)
+        response = self.authorized_client.get(INDEX_URL)
+        self.assertIsNotNone(response.context)
+
+    def test_new_comment_invalidates_post_page(self):
+        """Новый комментарий сбрасывает страницу поста."""
+        before = self.client.get(self.POST_DETAIL_URL)
+        self.post.comments.create(author=self.user, text="Комментарий")
+        after = self.client.get(self.POST_DETAIL_URL)
+        self.assertIsNotNone(after.context)
+        self.assertNotEqual(before["ETag"], after["ETag"])
+
+    def test_commenter_rename_invalidates_post_pages(self):
+        """Смена имени комментатора сбрасывает страницы его комментариев."""
+        commenter = User.objects.create_user(username="commenter")
+        self.post.comments.create(author=commenter, text="Комментарий")
+        comments_url = reverse("posts:post_comments",
+                               kwargs={"post_id": self.post.pk})
+        for url in (self.POST_DETAIL_URL, comments_url):
+            self.client.get(url)
+        commenter.username = "renamed"
+        commenter.save()
+        for url in (self.POST_DETAIL_URL, comments_url):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertIsNotNone(response.context)
+                self.assertContains(response, "/profile/renamed/")
+                self.assertNotContains(response, "/profile/commenter/")
+
+
+class FeedQueryBudgetTest(TestCase):
+    """Число запросов ленты не зависит от числа постов на странице"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=USERNAME)
+        cls.reader = User.objects.create_user(username=USERNAME2)
+        cls.group = Group.objects.create(
+            title="Тестовая группа",
+            slug=GROUP_SLUG,
+            description="Тестовое описание",
+        )
+        Follow.objects.create(user=cls.reader, author=cls.user)
+        for i in range(POSTS_PER_PAGE + POSTS_PER_PAGE2):
+            Post.objects.create(author=cls.user, group=cls.group,
+                                text=f"Текст {i}")
+        cls.authorized_client = Client()
+        cls.authorized_client.force_login(cls.reader)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_feed_query_budget(self):
+        """Ленты укладываются в фиксированный бюджет запросов."""
+        # Граф подписок читается один раз на главной, дальше он в кэше.
+        budgets = (
+            (INDEX_URL, 5),
+            (GROUP_URL, 5),
+            (PROFILE_URL, 6),
+            (FOLLOW_INDEX_URL, 5),
+        )
+        for url, queries in budgets:
+            with self.subTest(url=url):
+                with self.assertNumQueries(queries):
+                    self.authorized_client.get(url)
+
+
+class CommentsPaginationTest(TestCase):
+    """Комментарии поста выводятся срезами по курсору"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=USERNAME)
+        cls.post = Post.objects.create(author=cls.user, text="Тестовый пост")
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=cls.user, text=f"Коммент {i}")
+            for i in range(COMMENTS_PER_PAGE + POSTS_PER_PAGE2)
+        )
+        cls.authorized_client = Client()
+        cls.authorized_client.force_login(cls.user)
+        cls.POST_DETAIL_URL = reverse(
+            "posts:post_detail", kwargs={"post_id": cls.post.pk}
+        )
+        cls.POST_COMMENTS_URL = reverse(
+            "posts:post_comments", kwargs={"post_id": cls.post.pk}
+        )
+
+    def test_comments_sliced_by_cursor(self):
+        """Страница поста показывает срез, остальное подгружается."""
+        first = self.authorized_client.get(
+            self.POST_DETAIL_URL
+        ).context["comments_page"]
+        self.assertEqual(len(first), COMMENTS_PER_PAGE)
+        response = self.authorized_client.get(
+            self.POST_COMMENTS_URL, {"cursor": first.next_cursor}
+        )
+        self.assertTemplateUsed(response, "includes/comment_list.html")
+        rest = response.context["comments_page"]
+        self.assertEqual(len(rest), POSTS_PER_PAGE2)
+        self.assertFalse(rest.has_next())
+        self.assertEqual(
+            list(first) + list(rest),
+            list(Comment.objects.order_by("-created", "-pk")),
+        )
+
+    def test_more_comments_link_works_without_script(self):
+        """Ссылка подгрузки ведет на страницу поста со следующим срезом,
+        а скрипт страницы подставляет фрагмент вместо нее."""
+        response = self.client.get(self.POST_DETAIL_URL)
+        cursor = response.context["comments_page"].next_cursor
+        self.assertContains(
+            response,
+            f'href="{self.POST_DETAIL_URL}?cursor={cursor}#comments"',
+        )
+        self.assertContains(
+            response, f'data-fragment="{self.POST_COMMENTS_URL}?cursor='
+        )
+        self.assertContains(response, "a[data-fragment]")
+        rest = self.client.get(
+            self.POST_DETAIL_URL, {"cursor": cursor}
+        ).context["comments_page"]
+        self.assertEqual(len(rest), POSTS_PER_PAGE2)
+
+
+class ThumbnailPipelineTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=USERNAME)
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text="Пост с картинкой",
+            image=SimpleUploadedFile(
+                name="thumb.gif", content=SMALL_GIF,
+                content_type="image/gif"
+            ),
+        )
+        cls.POST_DETAIL_URL = reverse(
+            "posts:post_detail", kwargs={"post_id": cls.post.pk}
+        )
+
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch("posts.settings.THUMBNAIL_WORKERS", 0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_original_image_until_thumbnail_ready(self):
+        """Пока миниатюры нет, выводится исходная картинка."""
+        for url in (INDEX_URL, self.POST_DETAIL_URL):
+            with self.subTest(url=url):
+                self.assertContains(self.client.get(url),
+                                    f'src="{self.post.image.url}"')
+        thumbnails.schedule(self.post)
+        for url in (INDEX_URL, self.POST_DETAIL_URL):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertNotContains(response,
+                                       f'src="{self.post.image.url}"')
+                self.assertContains(response, 'src="/media/cache/')
+                self.assertContains(response, '<source type="image/webp"')
+                self.assertContains(response, ".webp 480w")
+                self.assertContains(response, ".jpg 960w")
+
+    def test_schedule_skips_ready_thumbnails(self):
+        """Готовые миниатюры повторно не генерируются."""
+        thumbnails.schedule(self.post)
+        with mock.patch("posts.thumbnails._render") as render:
+            thumbnails.schedule(self.post)
+        render.assert_not_called()
+
+    def test_prefetch_resolves_page_in_one_query(self):
+        """Миниатюры всей страницы находятся одним запросом."""
+        posts = [self.post] + [
+            Post.objects.create(
+                author=self.user, text=f"Пост {i}",
+                image=SimpleUploadedFile(
+                    name=f"thumb{i}.gif", content=SMALL_GIF,
+                    content_type="image/gif"
+                ),
+            ) for i in range(POSTS_PER_PAGE2 + 1)
+        ]
+        for post in posts:
+            thumbnails.schedule(post)
+        posts = list(Post.objects.filter(pk__in=[p.pk for p in posts]))
+        with self.assertNumQueries(1):
+            thumbnails.prefetch(posts, "feed")
+            for post in posts:
+                self.assertTrue(thumbnails.picture(post, "feed").ready)
+
+
+class ThumbnailPoolTest(TestCase):
+    """Миниатюры в пуле процессов: одна задача на картинку"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=USERNAME)
+        cls.post = Post.objects.create(
+            author=cls.user, text="Тестовый пост",
+            image=SimpleUploadedFile(
+                name="pool.gif", content=SMALL_GIF,
+                content_type="image/gif"
+            ),
+        )
+
+    def setUp(self):
+        cache.clear()
+        executor = mock.Mock()
+        executor.submit.side_effect = self.submit
+        patcher = mock.patch("posts.thumbnails._executor_instance",
+                             return_value=executor)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.executor = executor
+
+    @staticmethod
+    def submit(function, *args):
+        future = Future()
+        future.set_result(function(*args))
+        return future
+
+    def test_claimed_image_rendered_once(self):
+        """Пока картинка занята, другие запросы ее не рисуют, а результат
+        регистрирует поток регистрации."""
+        thumbnails.schedule(self.post)
+        thumbnails.schedule(self.post)
+        self.assertEqual(self.executor.submit.call_count, 1)
+        self.assertFalse(thumbnails.picture(self.post, "feed").ready)
+        with mock.patch("posts.thumbnails.connections.close_all"):
+            thumbnails._finish(*thumbnails._results.get_nowait())
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertTrue(thumbnails.picture(post, "feed").ready)
+        self.assertFalse(cache.get(thumbnails._claim_key(post.image.name)))
+
+
+class PageAuthorsTest(TestCase):
+    """Кнопки подписки на авторов страницы не попадают в общий кэш"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=USERNAME)
+        cls.reader = User.objects.create_user(username=USERNAME2)
+        cls.group = Group.objects.create(
+            title="Тестовая группа",
+            slug=GROUP_SLUG,
+            description="Тестовое описание",
+        )
+        Follow.objects.create(user=cls.reader, author=cls.user)
+        cls.post = Post.objects.create(author=cls.user, group=cls.group,
+                                       text="Тестовый пост")
+        cls.reader_client = Client()
+        cls.reader_client.force_login(cls.reader)
+        cls.author_client = Client()
+        cls.author_client.force_login(cls.user)
+        cls.unfollow_url = reverse("posts:profile_unfollow",
+                                   kwargs={"username": USERNAME})
+
+    def setUp(self):
+        cache.clear()
+
+    def test_follow_state_per_user(self):
+        """Подписчик видит «Отписаться», автор — ни одной кнопки."""
+        detail_url = reverse("posts:post_detail",
+                             kwargs={"post_id": self.post.pk})
+        for url in (INDEX_URL, GROUP_URL, detail_url):
+            with self.subTest(url=url):
+                response = self.reader_client.get(url)
+                self.assertEqual(response.context["page_authors"],
+                                 [(self.user, True)])
+                self.assertContains(response, self.unfollow_url)
+                response = self.author_client.get(url)
+                self.assertEqual(response.context["page_authors"], [])
+                self.assertNotContains(response, self.unfollow_url)
+                self.assertNotContains(response, "Подписаться")
+
+    def test_anonymous_page_not_read(self):
+        """Для анонима авторы страницы не вычисляются."""
+        response = self.client.get(INDEX_URL)
+        self.assertEqual(response.context["page_authors"], [])
+        self.assertNotContains(response, self.unfollow_url)
+
+
+class PostCardCacheTest(TestCase):
+    """Карточки постов кэшируются по версии поста"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=USERNAME)
+        cls.reader = User.objects.create_user(username=USERNAME2)
+        cls.group = Group.objects.create(
+            title="Тестовая группа",
+            slug=GROUP_SLUG,
+            description="Тестовое описание",
+        )
+        Follow.objects.create(user=cls.reader, author=cls.user)
+        cls.post = Post.objects.create(author=cls.user, group=cls.group,
+                                       text="Тестовый пост")
+        cls.authorized_client = Client()
+        cls.authorized_client.force_login(cls.reader)
+
+    def setUp(self):
+        cache.clear()
+
+    def version(self):
+        return Post.objects.values_list("version", flat=True).get(
+            pk=self.post.pk
+        )
+
+    def test_cards_shared_between_feeds(self):
+        """Карточка, нарисованная на одной ленте, берется из кэша на другой."""
+        response = self.authorized_client.get(INDEX_URL)
+        self.assertTemplateUsed(response, "includes/post.html")
+        self.assertIn("Тестовый пост", cache.get(cards.key(self.post)))
+        for url in (FOLLOW_INDEX_URL, GROUP_URL, PROFILE_URL):
+            with self.subTest(url=url):
+                response = self.authorized_client.get(url)
+                self.assertTemplateNotUsed(response, "includes/post.html")
+                self.assertContains(response, "Тестовый пост")
+
+    def test_version_bumped(self):
+        """Правка поста, имени автора и группы меняет версию карточки."""
+        def rename_author():
+            self.user.first_name = "Лев"
+            self.user.save()
+
+        def change_slug():
+            self.group.slug = "new-slug"
+            self.group.save()
+
+        changes = (
+            ("post", lambda: Post.objects.get(pk=self.post.pk).save()),
+            ("author", rename_author),
+            ("group", change_slug),
+            ("group deleted", lambda: self.group.delete()),
+        )
+        for name, change in changes:
+            with self.subTest(change=name):
+                before = self.version()
+                change()
+                self.assertNotEqual(self.version(), before)
+
+    def test_ready_thumbnails_bump_version(self):
+        """Готовые миниатюры меняют версию карточки поста."""
+        post = Post.objects.create(
+            author=self.user, text="Пост с картинкой",
+            image=SimpleUploadedFile(name="card.gif", content=SMALL_GIF,
+                                     content_type="image/gif"),
+        )
+        before = post.version
+        thumbnails.schedule(post, inline=True)
+        post.refresh_from_db()
+        self.assertNotEqual(post.version, before)
+
+
+class SearchViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=USERNAME)
+        cls.user2 = User.objects.create_user(username=USERNAME2)
+        cls.group = Group.objects.create(title="Группа", slug=GROUP_SLUG,
+                                         description="Описание")
+        cls.weak = Post.objects.create(author=cls.user, text="Ёжик в тумане")
+        cls.strong = Post.objects.create(
+            author=cls.user, group=cls.group,
+            text="Ёжик, ежик и еще раз ежик в тумане",
+        )
+        cls.other = Post.objects.create(author=cls.user2,
+                                        text="Лошадка в тумане")
+        Comment.objects.create(post=cls.other, author=cls.user,
+                               text="Тут был ежик")
+
+    def search(self, **params):
+        response = self.client.get(SEARCH_URL, params)
+        return list(response.context["page_obj"])
+
+    def test_search_backends(self):
+        """Поиск ранжирует, ищет в комментариях и фильтрует."""
+        for backend in (search.FTS5, search.PYTHON):
+            with self.subTest(backend=backend), mock.patch(
+                "posts.settings.SEARCH_BACKEND", backend
+            ):
+                search.rebuild()
+                self.assertEqual(self.search(q="ЕЖИК"),
+                                 [self.strong, self.weak, self.other])
+                self.assertEqual(self.search(q="ежик лошадка"),
+                                 [self.other])
+                self.assertEqual(self.search(q="ежик", group=GROUP_SLUG),
+                                 [self.strong])
+                self.assertEqual(self.search(q="туман", author=USERNAME2),
+                                 [])
+                self.assertEqual(self.search(q="тумане",
+                                             author=USERNAME2),
+                                 [self.other])
+
+    def test_comment_indexed_alone(self):
+        """Комментарий индексируется без чтения остальных комментариев."""
+        for backend in (search.FTS5, search.PYTHON):
+            with self.subTest(backend=backend), mock.patch(
+                "posts.settings.SEARCH_BACKEND", backend
+            ):
+                search.rebuild()
+                with CaptureQueriesContext(connection) as queries:
+                    comment = Comment.objects.create(
+                        post=self.other, author=self.user2, text="Ежик"
+                    )
+                    comment.delete()
+                self.assertFalse([
+                    query for query in queries
+                    if query["sql"].startswith("SELECT")
+                    and 'FROM "posts_comment"' in query["sql"]
+                ])
+                self.assertEqual(self.search(q="ежик лошадка"),
+                                 [self.other])
+
+    def test_backend_checked_per_database(self):
+        """Наличие таблицы FTS5 запоминается отдельно для каждой базы
+        и перепроверяется после миграций."""
+        search.reset()
+        self.addCleanup(search.reset)
+        self.assertEqual(search.backend(), search.FTS5)
+        connections = {"default": connection,
+                       "replica": mock.Mock(vendor="postgresql")}
+        with mock.patch("posts.search.connections", connections):
+            self.assertEqual(search.backend("replica"), search.PYTHON)
+            self.assertEqual(search.backend(), search.FTS5)
+        search._fts5_tables[DEFAULT_DB_ALIAS] = False
+        call_command("migrate", "posts", verbosity=0)
+        self.assertEqual(search.backend(), search.FTS5)
+
+    def test_index_follows_signals(self):
+        """Индекс обновляется при изменении постов и комментариев."""
+        for backend in (search.FTS5, search.PYTHON):
+            with self.subTest(backend=backend), mock.patch(
+                "posts.settings.SEARCH_BACKEND", backend
+            ):
+                search.rebuild()
+                post = Post.objects.create(author=self.user, text="Слон")
+                self.assertEqual(self.search(q="слон"), [post])
+                comment = Comment.objects.create(post=post,
+                                                 author=self.user,
+                                                 text="Жираф")
+                self.assertEqual(self.search(q="жираф"), [post])
+                comment.delete()
+                self.assertEqual(self.search(q="жираф"), [])
+                post.delete()
+                self.assertEqual(self.search(q="слон"), [])
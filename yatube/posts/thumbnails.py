@@ -0,0 +1,200 @@
+"""Миниатюры картинок постов.
+
+Каждый процесс веб-сервера держит свой пул THUMBNAIL_WORKERS
+процессов, которые только рисуют файлы. Результаты заносит в базу
+отдельный поток процесса (_registrar), а не служебный поток пула.
+Одна картинка рисуется одним процессом сервера: очередь защищена
+блокировкой в общем кэше. Без фоновых процессов (THUMBNAIL_WORKERS = 0)
+миниатюры готовятся в потоке запроса или командой generate_thumbnails.
+"""
+import logging
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.cache import cache
+from django.db import connections
+from sorl.thumbnail import default
+
+from . import generations, settings
+from .models import Post, new_version
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_registrar = None
+_results = queue.Queue()
+_lock = threading.Lock()
+
+
+def _executor_instance():
+    """Пул процессов и поток регистрации, создаются при первой задаче"""
+    global _executor, _registrar
+    with _lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                initializer=django.setup,
+            )
+            _registrar = threading.Thread(
+                target=_registrar_loop, name="thumbnails", daemon=True
+            )
+            _registrar.start()
+        return _executor
+
+
+def _claim_key(name):
+    return f"posts:thumbnails:claim:{name}"
+
+
+def variants(kind):
+    """Варианты миниатюры: (ширина, формат, геометрия, опции)"""
+    geometry, options = settings.POST_THUMBNAILS[kind]
+    width, height = map(int, geometry.split("x"))
+    for target in settings.POST_THUMBNAIL_WIDTHS:
+        if target > width:
+            continue
+        size = f"{target}x{round(height * target / width)}"
+        for format_ in settings.POST_THUMBNAIL_FORMATS:
+            yield target, format_, size, {**options, "format": format_}
+
+
+def _all_variants():
+    return [(geometry, options)
+            for kind in settings.POST_THUMBNAILS
+            for _, _, geometry, options in variants(kind)]
+
+
+class Picture:
+    """Миниатюры картинки поста для <picture> с srcset.
+
+    Пока варианты не готовы, src указывает на исходную картинку.
+    """
+
+    def __init__(self, image, found):
+        self.image = image
+        self.found = [(width, format_, thumbnail)
+                      for width, format_, thumbnail in found if thumbnail]
+        self.ready = len(self.found) == len(found)
+        self.sizes = settings.POST_THUMBNAIL_SIZES
+
+    def _srcset(self, format_):
+        return ", ".join(f"{thumbnail.url} {width}w"
+                         for width, variant, thumbnail in self.found
+                         if variant == format_)
+
+    @property
+    def src(self):
+        fallback = [thumbnail for _, format_, thumbnail in self.found
+                    if format_ == settings.POST_THUMBNAIL_FORMATS[-1]]
+        return fallback[-1].url if fallback else self.image.url
+
+    @property
+    def srcset(self):
+        return self._srcset(settings.POST_THUMBNAIL_FORMATS[-1])
+
+    @property
+    def sources(self):
+        """Пары (MIME-тип, srcset) для <source> в порядке предпочтения"""
+        sources = []
+        for format_ in settings.POST_THUMBNAIL_FORMATS[:-1]:
+            srcset = self._srcset(format_)
+            if srcset:
+                sources.append((f"image/{format_.lower()}", srcset))
+        return sources
+
+
+def _render(name, jobs):
+    """Выполняется в процессе пула: пишет файлы и возвращает размеры"""
+    return [default.backend.render(name, geometry, **options).size
+            for geometry, options in jobs]
+
+
+def _register(post, jobs, sizes):
+    """Заносим миниатюры в KV-хранилище и сбрасываем страницы с постом"""
+    for (geometry, options), size in zip(jobs, sizes):
+        default.backend.register(post.image.name, geometry, size, **options)
+    Post.objects.filter(pk=post.pk).update(version=new_version())
+    generations.bump(
+        generations.INDEX,
+        generations.profile(post.author_id),
+        generations.post(post.pk),
+        post.group_id and generations.group(post.group_id),
+    )
+
+
+def _finish(post, jobs, future):
+    """Регистрируем результат задачи пула и снимаем блокировку"""
+    try:
+        _register(post, jobs, future.result())
+    except Exception:
+        logger.exception("Не удалось подготовить миниатюры %s",
+                         post.image.name)
+    finally:
+        cache.delete(_claim_key(post.image.name))
+        connections.close_all()
+
+
+def _registrar_loop():
+    """Поток регистрации: ORM работает здесь, а не в служебном потоке
+    пула; соединения с базой закрываются после каждой задачи"""
+    while True:
+        _finish(*_results.get())
+
+
+def prefetch(posts, kind):
+    """Находим миниатюры всех постов страницы одним запросом"""
+    posts = [post for post in posts if post.image]
+    if not posts:
+        return
+    kind_variants = list(variants(kind))
+    found = iter(default.backend.cached_many([
+        (post.image, geometry, options)
+        for post in posts
+        for _, _, geometry, options in kind_variants
+    ]))
+    for post in posts:
+        post.__dict__.setdefault("_pictures", {})[kind] = Picture(
+            post.image,
+            [(width, format_, next(found))
+             for width, format_, _, _ in kind_variants],
+        )
+
+
+def picture(post, kind):
+    """Миниатюры поста: из предвыборки или отдельным запросом"""
+    if not post.image:
+        return None
+    if kind not in post.__dict__.get("_pictures", {}):
+        prefetch([post], kind)
+    return post._pictures[kind]
+
+
+def schedule(post, inline=False):
+    """Ставим в очередь все недостающие миниатюры картинки поста.
+
+    Все варианты готовятся одной задачей пула, поэтому страницы
+    с постом сбрасываются один раз. С inline=True миниатюры
+    готовятся сразу в текущем процессе.
+    """
+    image = post.image
+    if not image:
+        return
+    jobs = _all_variants()
+    found = default.backend.cached_many(
+        [(image, geometry, options) for geometry, options in jobs]
+    )
+    jobs = [job for job, thumbnail in zip(jobs, found) if thumbnail is None]
+    if not jobs:
+        return
+    if inline or not settings.THUMBNAIL_WORKERS:
+        _register(post, jobs, _render(image.name, jobs))
+        return
+    if not cache.add(_claim_key(image.name), True,
+                     settings.THUMBNAIL_CLAIM_TIMEOUT):
+        return
+    future = _executor_instance().submit(_render, image.name, jobs)
+    future.add_done_callback(
+        lambda future: _results.put((post, jobs, future))
+    )
@@ -0,0 +1,299 @@
+import csv
+import json
+from contextlib import contextmanager
+from itertools import islice
+
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import counters, feed, generations, search
+from .models import Comment, Follow, Group, Post, User
+
+JSONL = "jsonl"
+CSV = "csv"
+FORMATS = (JSONL, CSV)
+
+# Колонки выгрузки и откуда они берутся в базе. Посты и комментарии
+# сохраняют id, чтобы комментарии можно было привязать к постам.
+COLUMNS = {
+    "groups": {
+        "slug": "slug",
+        "title": "title",
+        "description": "description",
+    },
+    "posts": {
+        "id": "pk",
+        "author": "author__username",
+        "group": "group__slug",
+        "text": "text",
+        "pub_date": "pub_date",
+        "image": "image",
+    },
+    "comments": {
+        "id": "pk",
+        "post": "post_id",
+        "author": "author__username",
+        "text": "text",
+        "created": "created",
+    },
+    "follows": {
+        "user": "user__username",
+        "author": "author__username",
+    },
+}
+# Уникальный ключ строк каждого вида. Строки с ключом, который уже
+# есть в базе, не перезаписывают чужие данные, а пропускаются.
+KEYS = {
+    "groups": ("slug",),
+    "posts": ("pk",),
+    "comments": ("pk",),
+    "follows": ("user_id", "author_id"),
+}
+MODELS = {
+    "groups": Group,
+    "posts": Post,
+    "comments": Comment,
+    "follows": Follow,
+}
+
+
+def _value(value):
+    if value is None:
+        return ""
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return value
+
+
+def export_rows(kind, chunk_size):
+    """Строки выгрузки: словари, читаются из базы пачками"""
+    columns = COLUMNS[kind]
+    rows = MODELS[kind].objects.order_by("pk").values_list(
+        *columns.values()
+    )
+    for row in rows.iterator(chunk_size=chunk_size):
+        yield dict(zip(columns, map(_value, row)))
+
+
+def write_rows(kind, rows, file, format_):
+    """Пишем строки в файл построчно, возвращаем их число"""
+    count = 0
+    if format_ == CSV:
+        writer = csv.DictWriter(file, fieldnames=list(COLUMNS[kind]))
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+        return count
+    for row in rows:
+        file.write(json.dumps(row, ensure_ascii=False) + "\n")
+        count += 1
+    return count
+
+
+def read_rows(file, format_):
+    """Читаем строки из файла по одной"""
+    if format_ == CSV:
+        yield from csv.DictReader(file)
+        return
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
+
+
+class Lookup:
+    """Кэш «имя -> id» для пользователей или групп.
+
+    Неизвестные имена догружаются одним запросом на пачку строк.
+    """
+
+    def __init__(self, model, field):
+        self.model = model
+        self.field = field
+        self.ids = {}
+
+    def load(self, names):
+        missing = {name for name in names if name and name not in self.ids}
+        if not missing:
+            return
+        found = self.model.objects.filter(
+            **{f"{self.field}__in": missing}
+        ).values_list(self.field, "pk")
+        self.ids.update(dict.fromkeys(missing))
+        self.ids.update(found)
+
+    def __getitem__(self, name):
+        return self.ids.get(name)
+
+
+@contextmanager
+def _keep_dates(model):
+    """Не даем auto_now_add затереть даты из выгрузки"""
+    fields = [field for field in model._meta.concrete_fields
+              if getattr(field, "auto_now_add", False)]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def _int(value):
+    """Число из ячейки выгрузки или None, если его там нет"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _parsed(row):
+    """Заполненные id и ссылка на пост - числа: иначе строка
+    пропускается, как строка с неизвестной ссылкой"""
+    return all(_int(row[name]) is not None for name in ("id", "post")
+               if row.get(name))
+
+
+def _id(row):
+    return int(row["id"]) if row.get("id") else None
+
+
+def _date(value):
+    date = parse_datetime(value) if value else None
+    if date is None:
+        return timezone.now()
+    if timezone.is_naive(date):
+        return timezone.make_aware(date)
+    return date
+
+
+class Importer:
+    """Загрузка строк одного вида пачками через bulk_create.
+
+    Каждая пачка пишется в своей транзакции. Строки со ссылками на
+    неизвестных пользователей, группы или посты пропускаются, как и
+    строки с уже занятым id, slug или парой подписки: иначе посты
+    легли бы поверх чужих id, а их комментарии — к чужим постам.
+    """
+
+    def __init__(self, kind, batch_size):
+        self.kind = kind
+        self.batch_size = batch_size
+        self.users = Lookup(User, "username")
+        self.groups = Lookup(Group, "slug")
+        self.posts = Lookup(Post, "pk")
+        self.scopes = set()
+        self.loaded = 0
+        self.skipped = 0
+
+    def run(self, rows):
+        """Загружаем строки; уже записанные пачки пересчитываются,
+        даже если загрузка оборвалась на середине"""
+        model = MODELS[self.kind]
+        rows = iter(rows)
+        try:
+            with _keep_dates(model):
+                for batch in iter(
+                    lambda: list(islice(rows, self.batch_size)), []
+                ):
+                    objects = self.build(batch)
+                    self.skipped += len(batch) - len(objects)
+                    with transaction.atomic():
+                        model.objects.bulk_create(
+                            objects, batch_size=self.batch_size
+                        )
+                    self.loaded += len(objects)
+        finally:
+            self.finish()
+        return self.loaded, self.skipped
+
+    def build(self, batch):
+        batch = [row for row in batch if _parsed(row)]
+        self.users.load(row.get(name) for row in batch
+                        for name in ("author", "user"))
+        self.groups.load(row.get("group") for row in batch)
+        self.posts.load(_int(row.get("post")) for row in batch)
+        return self._new([obj for obj in map(getattr(self, f"_{self.kind}"),
+                                             batch)
+                          if obj is not None])
+
+    def _new(self, objects):
+        """Оставляем объекты, чьих ключей нет ни в базе, ни выше в пачке"""
+        fields = KEYS[self.kind]
+
+        def key(obj):
+            return tuple(getattr(obj, field) for field in fields)
+
+        keys = [key(obj) for obj in objects if None not in key(obj)]
+        taken = set()
+        if keys:
+            taken.update(MODELS[self.kind].objects.filter(**{
+                f"{fields[0]}__in": {key[0] for key in keys}
+            }).values_list(*fields))
+        new = []
+        for obj in objects:
+            if None not in key(obj):
+                if key(obj) in taken:
+                    continue
+                taken.add(key(obj))
+            new.append(obj)
+        return new
+
+    def _groups(self, row):
+        self.scopes.add(generations.GROUPS)
+        return Group(slug=row["slug"], title=row["title"],
+                     description=row.get("description", ""))
+
+    def _posts(self, row):
+        author_id = self.users[row["author"]]
+        if author_id is None:
+            return None
+        group_id = self.groups[row.get("group")]
+        self.scopes.update((generations.INDEX,
+                            generations.profile(author_id),
+                            generations.stats(author_id)))
+        if group_id:
+            self.scopes.add(generations.group(group_id))
+        return Post(pk=_id(row), author_id=author_id,
+                    group_id=group_id, text=row["text"],
+                    pub_date=_date(row.get("pub_date")),
+                    image=row.get("image", ""))
+
+    def _comments(self, row):
+        author_id = self.users[row["author"]]
+        post_id = self.posts[_int(row.get("post"))]
+        if author_id is None or post_id is None:
+            return None
+        self.scopes.update((generations.post(post_id),
+                            generations.stats(author_id)))
+        return Comment(pk=_id(row), post_id=post_id,
+                       author_id=author_id, text=row["text"],
+                       created=_date(row.get("created")))
+
+    def _follows(self, row):
+        user_id = self.users[row["user"]]
+        author_id = self.users[row["author"]]
+        if user_id is None or author_id is None or user_id == author_id:
+            return None
+        self.scopes.update((generations.stats(user_id),
+                            generations.stats(author_id),
+                            generations.GRAPH))
+        return Follow(user_id=user_id, author_id=author_id)
+
+    def finish(self):
+        """Пересчитываем то, что обычно обновляют сигналы"""
+        model = MODELS[self.kind]
+        statements = connection.ops.sequence_reset_sql(no_style(), [model])
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+        if self.kind != "groups":
+            counters.rebuild()
+        if self.kind in ("posts", "follows"):
+            feed.rebuild()
+        if self.kind in ("posts", "comments"):
+            search.rebuild()
+        generations.bump(*self.scopes)
@@ -21,6 +21,9 @@ urlpatterns = [
          views.add_comment, name='add_comment'),
     path('profile/<str:username>/', views.profile, name='profile'),
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
+    path('posts/<int:post_id>/comments/',
+         views.post_comments, name='post_comments'),
+    path('search/', views.search_posts, name='search'),
     path('create/', views.post_create, name='post_create'),
     path('posts/<int:post_id>/edit/', views.post_edit, name='post_edit'),
     path('', views.index, name='index'),
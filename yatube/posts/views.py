@@ -2,68 +2,178 @@ from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
 from django.shortcuts import get_object_or_404, render, redirect
 
-from .forms import PostForm, CommentForm
+from core.replicas import read_replica, writes_primary
+
+from . import counters, feed, generations, graph, search
+from .decorators import cache_anonymous_page
+from .forms import CommentForm, PostForm, SearchForm
 from .models import Group, Post, User, Follow
-from .settings import POSTS_PER_PAGE
+from .pagination import FEED_ORDERING, KeysetPaginator
+from .settings import (COMMENTS_ORDERING, COMMENTS_PER_PAGE, CURSOR_PARAM,
+                       KEYSET_PAGINATION, POSTS_PER_PAGE)
+
 
+def paginator_page(request, posts, keyset=False, ordering=FEED_ORDERING):
+    """Пагинатор.
 
-def paginator_page(request, posts):
-    """Пагинатор"""
+    Ленты с keyset=True переходят на курсорную пагинацию, если она
+    включена в настройках или запрошена параметром ?cursor=.
+    ordering — ключ курсора, совпадающий с сортировкой posts.
+    """
+    if keyset and (KEYSET_PAGINATION or CURSOR_PARAM in request.GET):
+        paginator = KeysetPaginator(posts, POSTS_PER_PAGE, ordering=ordering)
+        return paginator.get_page(request.GET.get(CURSOR_PARAM))
     paginator = Paginator(posts, POSTS_PER_PAGE)
     page_number = request.GET.get("page")
     return paginator.get_page(page_number)
 
 
+def _group_scopes(slug):
+    group_id = Group.objects.filter(slug=slug).values_list(
+        "pk", flat=True).first()
+    return group_id and (generations.group(group_id),)
+
+
+def _profile_scopes(username):
+    author_id = User.objects.filter(username=username).values_list(
+        "pk", flat=True).first()
+    return author_id and (
+        generations.profile(author_id),
+        generations.stats(author_id),
+        generations.GROUPS,
+    )
+
+
+def _post_scopes(post_id):
+    author_id = Post.objects.filter(pk=post_id).values_list(
+        "author_id", flat=True).first()
+    return author_id and (
+        generations.post(post_id),
+        generations.profile(author_id),
+        generations.GROUPS,
+    )
+
+
+def comments_page(request, post):
+    """Срез комментариев поста по курсору"""
+    paginator = KeysetPaginator(
+        post.comments.select_related("author").only(
+            "text", "created", "post", "author", "author__username"
+        ),
+        COMMENTS_PER_PAGE,
+        ordering=COMMENTS_ORDERING,
+    )
+    return paginator.get_page(request.GET.get(CURSOR_PARAM))
+
+
+@read_replica
+@cache_anonymous_page(lambda: (generations.INDEX,))
 def index(request):
     """Главная страница"""
-    posts = Post.objects.select_related("author").all()
-    page_obj = paginator_page(request, posts)
-    context = {"page_obj": page_obj}
+    posts = feed.for_listing(Post.objects.all())
+    page_obj = paginator_page(request, posts, keyset=True)
+    context = {
+        "page_obj": page_obj,
+        "page_authors": graph.page_authors(request.user, page_obj),
+        "cache_version": generations.versions(generations.INDEX),
+    }
     return render(request, "posts/index.html", context)
 
 
+@read_replica
+@cache_anonymous_page(_group_scopes)
 def group_posts(request, slug):
     """Страница сообщества для постов"""
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all()
-    page_obj = paginator_page(request, posts)
+    posts = feed.for_listing(group.posts.all())
+    page_obj = paginator_page(request, posts, keyset=True)
     context = {
         "group": group,
         "page_obj": page_obj,
+        "page_authors": graph.page_authors(request.user, page_obj),
+        "cache_version": generations.versions(
+            generations.group(group.pk)
+        ),
     }
     return render(request, "posts/group_list.html", context)
 
 
+@read_replica
+@cache_anonymous_page(_profile_scopes)
 def profile(request, username):
     """Здесь код запроса к модели и создание словаря контекста"""
     author = get_object_or_404(User, username=username)
     following = (
-        request.user.is_authenticated
-        and request.user != author
-        and request.user.follower.filter(author=author).exists()
+        request.user != author
+        and graph.is_following(request.user, author)
     )
-    post_list = author.posts.all()
-    page_obj = paginator_page(request, post_list)
+    post_list = feed.for_listing(author.posts.all())
+    page_obj = paginator_page(request, post_list, keyset=True)
     context = {
         "author": author,
+        "stats": counters.stats(author),
         "page_obj": page_obj,
         "following": following,
+        "cache_version": generations.versions(
+            generations.profile(author.pk), generations.GROUPS
+        ),
     }
     return render(request, "posts/profile.html", context)
 
 
+@read_replica
+@cache_anonymous_page(_post_scopes)
 def post_detail(request, post_id):
     """Здесь код запроса к модели и создание словаря контекста"""
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_object_or_404(Post.objects.select_related("author"),
+                             pk=post_id)
     form = CommentForm()
     context = {
         "post": post,
+        "stats": counters.stats(post.author),
+        "comments_page": comments_page(request, post),
+        "page_authors": graph.page_authors(request.user, [post]),
         "form": form,
     }
     return render(request, "posts/post_detail.html", context)
 
 
+@cache_anonymous_page(lambda post_id: (generations.post(post_id),))
+def post_comments(request, post_id):
+    """Следующий срез комментариев для подгрузки на странице поста"""
+    post = get_object_or_404(Post.objects.only("pk"), pk=post_id)
+    context = {
+        "post": post,
+        "comments_page": comments_page(request, post),
+    }
+    return render(request, "includes/comment_list.html", context)
+
+
+def search_posts(request):
+    """Поиск по текстам постов и комментариев"""
+    form = SearchForm(request.GET or None)
+    page_obj = None
+    if form.is_valid():
+        posts = Post.objects.all()
+        if form.cleaned_data["group"]:
+            posts = posts.filter(group=form.cleaned_data["group"])
+        if form.cleaned_data["author"]:
+            posts = posts.filter(
+                author__username=form.cleaned_data["author"]
+            )
+        posts = feed.for_listing(
+            search.search(form.cleaned_data["q"], posts)
+        )
+        page_obj = paginator_page(request, posts)
+    query = request.GET.copy()
+    query.pop("page", None)
+    context = {"form": form, "page_obj": page_obj,
+               "query": query.urlencode()}
+    return render(request, "posts/search.html", context)
+
+
 @login_required
+@writes_primary
 def post_create(request):
     """Создание поста"""
     form = PostForm(request.POST or None, files=request.FILES or None)
@@ -76,6 +186,7 @@ def post_create(request):
 
 
 @login_required
+@writes_primary
 def post_edit(request, post_id):
     """Редактирование поста"""
     post = get_object_or_404(Post, pk=post_id)
@@ -91,6 +202,7 @@ def post_edit(request, post_id):
 
 
 @login_required
+@writes_primary
 def add_comment(request, post_id):
     """Добавление комментария"""
     # Получите пост и сохраните его в переменную post.
@@ -104,16 +216,19 @@ def add_comment(request, post_id):
     return redirect("posts:post_detail", post_id=post_id)
 
 
+@read_replica
 @login_required
 def follow_index(request):
     """Отображение постов фоловера"""
-    posts = Post.objects.filter(author__following__user=request.user)
-    page_obj = paginator_page(request, posts)
+    posts = feed.follow_feed(request.user)
+    page_obj = paginator_page(request, posts, keyset=True,
+                              ordering=feed.INBOX_ORDERING)
     context = {"page_obj": page_obj}
     return render(request, "posts/follow.html", context)
 
 
 @login_required
+@writes_primary
 def profile_follow(request, username):
     """Кнопка подписаться"""
     if request.user.username != username:
@@ -123,6 +238,7 @@ def profile_follow(request, username):
 
 
 @login_required
+@writes_primary
 def profile_unfollow(request, username):
     """Отписка"""
     get_object_or_404(Follow, user=request.user,
@@ -50,11 +50,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.ReplicaMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -89,9 +91,44 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # Соединение переиспользуется запросами потока до минуты.
+        'CONN_MAX_AGE': 60,
+        'OPTIONS': {
+            # Сколько секунд ждать снятия блокировки записи.
+            'timeout': 5,
+        },
     }
 }
 
+# Алиасы реплик из DATABASES для чтения в view с core.replicas.read_replica,
+# например ['replica'] с 'TEST': {'MIRROR': 'default'}. Пустой список
+# отключает ReplicaMiddleware, и все запросы идут в default.
+DATABASE_REPLICAS = []
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+# Сколько секунд после своей записи пользователь читает с основной базы.
+REPLICA_STICKY_SECONDS = 10
+# Сколько секунд живут в кэше страницы и фрагменты, прочитанные
+# с реплики: не меньше ожидаемого отставания реплики.
+REPLICA_CACHE_TIMEOUT = 5
+
+# Прагмы для каждого нового соединения с SQLite (core.sqlite): WAL
+# позволяет читать во время записи, NORMAL не ждет fsync на каждый
+# коммит, mmap и кэш страниц (в КиБ при отрицательном значении)
+# сокращают системные вызовы при чтении.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,
+    'temp_store': 'memory',
+}
+# Режим BEGIN для transaction.atomic: IMMEDIATE сразу берет блокировку
+# записи, DEFERRED — поведение SQLite по умолчанию.
+SQLITE_TRANSACTION_MODE = 'IMMEDIATE'
+# Повторы запроса вне транзакции при «database is locked».
+SQLITE_LOCK_RETRIES = 5
+SQLITE_RETRY_DELAY = 0.05
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -111,10 +148,25 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Двухуровневый кэш (core.cache): горячие ключи в памяти процесса
+# на LOCAL_TIMEOUT секунд поверх общего для всех воркеров кэша.
+# Общий кэш — файл SQLite рядом с базой; его можно заменить на Redis
+# или memcached, поменяв BACKEND и LOCATION алиаса 'shared'.
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+        'BACKEND': 'core.cache.NearCache',
+        'OPTIONS': {
+            'SHARED': 'shared',
+            'LOCAL_TIMEOUT': 1,
+            'MAX_ENTRIES': 1000,
+        },
+    },
+    'shared': {
+        'BACKEND': 'core.cache.SQLiteCache',
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+        },
+    },
 }
 
 
@@ -151,3 +203,43 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
+
+THUMBNAIL_BACKEND = 'core.thumbnails.ThumbnailBackend'
+# Метаданные миниатюр хранятся в базе и общие для всех процессов.
+THUMBNAIL_KVSTORE = 'core.kvstore.KVStore'
+
+# Профилирование запросов: заголовок Server-Timing (при DEBUG или для
+# сотрудников) и отчеты о медленных запросах в ротируемый лог.
+PROFILING_ENABLED = True
+PROFILING_SLOW_MS = 500
+PROFILING_SAMPLE_RATE = 0.1
+
+# Защита фрагментов от лавины пересчетов (core.stampede): сколько
+# секунд держится блокировка пересчета, сколько ждать чужого пересчета
+# без устаревшей копии, сколько хранить устаревшую копию и насколько
+# рано (XFetch) пересчитывать значения со сроком жизни.
+STAMPEDE_LOCK_TIMEOUT = 10
+STAMPEDE_WAIT = 2
+STAMPEDE_STALE_TIMEOUT = 60 * 60
+STAMPEDE_BETA = 1
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'slow_requests': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': os.path.join(BASE_DIR, 'slow_requests.log'),
+            'maxBytes': 5 * 1024 * 1024,
+            'backupCount': 5,
+            'delay': True,
+        },
+    },
+    'loggers': {
+        'yatube.profiling': {
+            'handlers': ['slow_requests'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}